@@ -0,0 +1,45 @@
+import typing
+from bisect import bisect_right
+
+from .IParsingBackend import ErrorPolicy, mapWithErrorPolicy
+from .IWrapper import IParseResult, IWrapper
+from .utils import BufferT, iterRecords
+
+
+class AdaptiveWrapper:
+	"""Dispatches each input to the wrapper with the backend being the fastest for inputs of its length. Backends scale differently: the ones having a large constant cost of a parse are slow on short inputs, but may be the fastest on long ones.
+	`bounds` and `backendNames` are the crossovers as returned by `BenchmarkData.getCrossovers`. All the backends are kept loaded, a choice costs a binary search."""
+
+	__slots__ = ("bounds", "wrappers", "exClasses")
+
+	def __init__(self, grammarResources: "InMemoryGrammarResources", lazy: bool, bounds: typing.Sequence[int], backendNames: typing.Sequence[str]) -> None:
+		if len(backendNames) != len(bounds) + 1:
+			raise ValueError("There must be exactly one backend more than bounds", bounds, backendNames)
+
+		self.bounds = tuple(bounds)
+		self.wrappers = tuple(grammarResources.getWrapper(backendName, lazy) for backendName in backendNames)
+		self.exClasses = tuple({w.backend.__class__.EX_CLASS or Exception for w in self.wrappers})
+
+	def getWrapper(self, s: typing.Union[str, BufferT]) -> IWrapper:
+		"""Returns the wrapper to parse `s` with. For buffers their length in bytes is used, it is close enough to the one in chars."""
+		return self.wrappers[bisect_right(self.bounds, len(s))]
+
+	def __call__(self, s: typing.Union[str, BufferT]) -> typing.Union[typing.Iterable[IParseResult], IParseResult]:
+		return self.wrappers[bisect_right(self.bounds, len(s))](s)
+
+	def map(self, strs: typing.Iterable[typing.Union[str, BufferT]], errorPolicy: ErrorPolicy = ErrorPolicy.reraise) -> typing.Iterator[typing.Union[typing.Iterable[IParseResult], IParseResult, Exception]]:
+		"""Lazily parses each of `strs`, choosing a backend for each of them"""
+		bounds = self.bounds
+		wrappers = self.wrappers
+
+		def processSingle(s: typing.Union[str, BufferT]):
+			return wrappers[bisect_right(bounds, len(s))](s)
+
+		return mapWithErrorPolicy(processSingle, strs, self.exClasses, errorPolicy)
+
+	def stream(self, source: typing.Union[typing.IO, BufferT, typing.Iterable[typing.Union[str, BufferT]]], boundary: str = "\n", errorPolicy: ErrorPolicy = ErrorPolicy.reraise, chunkSize: int = 1 << 16, skipEmpty: bool = True) -> typing.Iterator[typing.Union[typing.Iterable[IParseResult], IParseResult, Exception]]:
+		"""Same as `IWrapper.stream`, but each record is dispatched by its length"""
+		records = iterRecords(source, boundary, chunkSize, self.wrappers[0].backend.__class__.ENCODING)
+		if skipEmpty:
+			records = filter(None, records)
+		return self.map(records, errorPolicy)
@@ -0,0 +1,125 @@
+import marshal
+import os
+import pickle
+import sys
+import typing
+from hashlib import sha256
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+from warnings import warn
+
+from .utils import compilePythonModule
+
+
+def hashSource(source: typing.Union[str, bytes]) -> str:
+	if isinstance(source, str):
+		source = source.encode("utf-8")
+	return sha256(source).hexdigest()
+
+
+class CompiledCache:
+	"""An opt-in on-disk cache of compiled grammars. Entries are stored in `<dir>/<tool name>/<sha256 of grammar source>.bin` and are validated against the source hash and the tool version, so stale entries are just recompiled and overwritten.
+	Code objects of python modules (wrappers and precompiled parsers) are cached as `.pyc`-like files in `<dir>/python`, keyed by the source hash and the interpreter version."""
+
+	__slots__ = ("dir",)
+
+	FORMAT_VERSION = 1
+	EXT = "bin"
+	CODE_DIR = "python"
+
+	def __init__(self, dir: Path) -> None:  # pylint:disable=redefined-builtin
+		self.dir = dir
+
+	def getPath(self, toolName: str, sourceHash: str) -> Path:
+		return self.dir / toolName / (sourceHash + "." + self.__class__.EXT)
+
+	def getCodePath(self, sourceHash: str) -> Path:
+		return self.dir / self.__class__.CODE_DIR / (sourceHash + "." + sys.implementation.cache_tag + ".pyc")
+
+	def load(self, toolName: str, sourceHash: str, toolVersion: typing.Optional[str]) -> typing.Optional[bytes]:
+		"""Returns the serialized compiled grammar or `None` if there is no valid one"""
+		try:
+			with self.getPath(toolName, sourceHash).open("rb") as f:
+				formatVersion, storedHash, storedToolVersion, payload = pickle.load(f)
+		except FileNotFoundError:
+			return None
+		except Exception:  # pylint:disable=broad-except
+			# a truncated or otherwise broken entry must not prevent us from parsing, it will be overwritten
+			return None
+
+		if formatVersion != self.__class__.FORMAT_VERSION or storedHash != sourceHash or storedToolVersion != toolVersion:
+			return None
+
+		return payload
+
+	def _replace(self, p: Path, data: bytes) -> None:
+		p.parent.mkdir(parents=True, exist_ok=True)
+
+		# multiple processes may share the same bundle, so the entry is written to a temporary file first and then atomically renamed
+		tmp = p.parent / (p.name + "." + str(os.getpid()) + ".tmp")
+		tmp.write_bytes(data)
+		os.replace(str(tmp), str(p))
+
+	def store(self, toolName: str, sourceHash: str, toolVersion: typing.Optional[str], payload: bytes) -> None:
+		self._replace(self.getPath(toolName, sourceHash), pickle.dumps((self.__class__.FORMAT_VERSION, sourceHash, toolVersion, payload), protocol=pickle.HIGHEST_PROTOCOL))
+
+	def getOrCompile(self, factory: "IParserFactoryFromSource", source: str) -> typing.Any:
+		"""Returns the compiled grammar from cache or compiles it with `factory` and puts it into the cache"""
+		toolName = factory.__class__.META.product.name
+		sourceHash = hashSource(source)
+		toolVersion = factory.__class__.getToolVersion()
+
+		payload = self.load(toolName, sourceHash, toolVersion)
+		if payload is not None:
+			try:
+				return factory.deserializeCompiled(payload)
+			except Exception:  # pylint:disable=broad-except
+				pass
+
+		res = factory.compileStr(source)
+
+		try:
+			payload = factory.serializeCompiled(res)
+		except Exception as ex:  # pylint:disable=broad-except
+			warn("Compiled " + toolName + " grammar cannot be serialized, so it is not cached: " + repr(ex))
+		else:
+			try:
+				self.store(toolName, sourceHash, toolVersion, payload)
+			except OSError as ex:
+				warn("Cannot store compiled " + toolName + " grammar into the cache: " + repr(ex))
+
+		return res
+
+	def loadCode(self, sourceHash: str) -> typing.Optional[CodeType]:
+		"""Returns the cached code object or `None` if there is no valid one. Like in `.pyc` files, the header is the interpreter magic number, it is followed by the source hash."""
+		header = MAGIC_NUMBER + bytes.fromhex(sourceHash)
+		try:
+			data = self.getCodePath(sourceHash).read_bytes()
+		except FileNotFoundError:
+			return None
+
+		if data[:len(header)] != header:
+			return None
+
+		try:
+			return marshal.loads(data[len(header):])
+		except (EOFError, ValueError, TypeError):
+			return None
+
+	def storeCode(self, sourceHash: str, code: CodeType) -> None:
+		self._replace(self.getCodePath(sourceHash), MAGIC_NUMBER + bytes.fromhex(sourceHash) + marshal.dumps(code))
+
+	def getOrCompileCode(self, source: bytes, getAST: typing.Callable[[], typing.Union[str, "ast.Module"]], fileName: typing.Union[Path, str], salt: str = "") -> CodeType:
+		"""Returns a code object for a python module from cache or compiles it. `getAST` is called only on a cache miss, so deserialization of the AST is skipped too. `salt` must be unique for each way the AST returned by `getAST` is postprocessed."""
+		sourceHash = hashSource(salt.encode("utf-8") + source)
+		res = self.loadCode(sourceHash)
+		if res is not None:
+			return res
+
+		res = compilePythonModule(getAST(), fileName)
+		try:
+			self.storeCode(sourceHash, res)
+		except OSError as ex:
+			warn("Cannot store compiled python module " + str(fileName) + " into the cache: " + repr(ex))
+		return res
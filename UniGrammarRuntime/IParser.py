@@ -1,3 +1,4 @@
+import pickle
 import typing
 from abc import abstractmethod, ABCMeta
 from pathlib import Path
@@ -8,7 +9,9 @@ from UniGrammarRuntimeCore.IParser import IParserFactoryFromPrecompiled as IPars
 from UniGrammarRuntimeCore.IParser import IParserFactoryFromSource as IParserFactoryFromSourceCore
 
 from .FormatMetadata import FormatMetadata
+from .ParserOptions import ParserOptions
 from .ToolMetadata import Product
+from .utils import execPythonCode, getDistributionVersion
 
 # pylint:disable=too-few-public-methods
 
@@ -27,24 +30,55 @@ class IParserFactoryMeta(ABCMeta):
 		return super().__new__(cls, className, parents, attrs)
 
 
-class IParserFactory(IParserFactoryCore, metaclass=IParserFactoryMeta):
+class ParserOptionsMixin:
+	__slots__ = ()
+
+	def applyOptions(self, parser: IParser, options: typing.Optional[ParserOptions]) -> IParser:
+		"""Configures a parser created by `fromBundle` according to `options`. The tools having no such settings just ignore them."""
+		return parser
+
+
+class IParserFactory(IParserFactoryCore, ParserOptionsMixin, metaclass=IParserFactoryMeta):
 	__slots__ = ()
 
 	FORMAT = None  # type: FormatMetadata
 
 	@abstractmethod
-	def fromBundle(self, grammarResources: "InMemoryGrammarResources"):
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None):
 		"""Creates an executor from the files within bundle"""
 		raise NotImplementedError
 
+	def getGrammarFiles(self, grammarResources: "InMemoryGrammarResources") -> typing.Iterable[Path]:
+		"""Returns the paths of the files of the grammar within the bundle this factory reads. Used to find out when benchmark results are outdated."""
+		return ()
 
-class IParserFactoryFromSource(IParserFactoryFromSourceCore, metaclass=IParserFactoryMeta):  # pylint:disable=abstract-method
+
+class IParserFactoryFromSource(IParserFactoryFromSourceCore, ParserOptionsMixin, metaclass=IParserFactoryMeta):  # pylint:disable=abstract-method
 	__slots__ = ()
 
 	FORMAT = None  # type: FormatMetadata
 
-	def fromBundle(self, grammarResources: "InMemoryGrammarResources") -> IParser:
-		return self.fromInternal(self.getSource(grammarResources))  # since they cannot be precompiled, for them internal repr is source text
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> IParser:
+		source = self.getSource(grammarResources)
+		cache = grammarResources.parent.compiledCache
+		if cache is None:
+			res = self.fromInternal(source)  # since they cannot be precompiled, for them internal repr is source text
+		else:
+			res = self.__class__.PARSER_CLASS(cache.getOrCompile(self, source))
+		return self.applyOptions(res, options)
+
+	@classmethod
+	def getToolVersion(cls) -> typing.Optional[str]:
+		"""Used to invalidate cached compiled grammars when the tool is updated"""
+		return getDistributionVersion(cls.META.product.name)
+
+	def serializeCompiled(self, compiled: typing.Any) -> bytes:
+		"""Serializes the object returned by `compileStr` to be stored in `CompiledCache`"""
+		return pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL)
+
+	def deserializeCompiled(self, data: bytes) -> typing.Any:
+		"""Inverse of `serializeCompiled`"""
+		return pickle.loads(data)
 
 	@classmethod
 	def _getExt(cls):
@@ -57,8 +91,12 @@ class IParserFactoryFromSource(IParserFactoryFromSourceCore, metaclass=IParserFa
 		"""Must return source code of the grammar in its DSL"""
 		return grammarResources.parent.backendsTextData[self.__class__.META.product.name, grammarResources.name + "." + self.__class__._getExt()]
 
+	def getGrammarFiles(self, grammarResources: "InMemoryGrammarResources") -> typing.Iterable[Path]:
+		"""The file with the grammar source in the tool DSL"""
+		return (grammarResources.parent.bundleDir / "compiled" / self.__class__.META.product.name / (grammarResources.name + "." + self.__class__._getExt()),)
 
-class IParserFactoryFromPrecompiled(IParserFactoryFromPrecompiledCore):  # pylint:disable=abstract-method
+
+class IParserFactoryFromPrecompiled(IParserFactoryFromPrecompiledCore, ParserOptionsMixin):  # pylint:disable=abstract-method
 	__slots__ = ()
 
 	FORMAT = FormatMetadata(
@@ -69,16 +107,34 @@ class IParserFactoryFromPrecompiled(IParserFactoryFromPrecompiledCore):  # pylin
 		),
 	)
 
-	def fromBundle(self, grammarResources: "InMemoryGrammarResources") -> IParser:
-		ctor = self.compile(self.getSource(grammarResources), grammarResources.name)
-		return self.fromInternal(ctor())
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> IParser:
+		cache = grammarResources.parent.compiledCache
+		if cache is None:
+			ctor = self.compile(self.getSource(grammarResources), grammarResources.name)
+		else:
+			fileName = self.getSourcePath(grammarResources)
+			code = cache.getOrCompileCode(fileName.read_bytes(), lambda: self.getSource(grammarResources), fileName, self.__class__.__qualname__)
+			ctor = self.processEvaledGlobals(execPythonCode(code), grammarResources.name)
+		return self.applyOptions(self.fromInternal(ctor()), options)
+
+	def getSourceKey(self, grammarResources: "InMemoryGrammarResources") -> typing.Tuple[str, str]:
+		"""Returns the key of the file with the precompiled parser within `backendsPythonAST`"""
+		return (self.__class__.META.product.name, grammarResources.name)
+
+	def getSourcePath(self, grammarResources: "InMemoryGrammarResources") -> Path:
+		toolName, stem = self.getSourceKey(grammarResources)
+		return grammarResources.parent.bundleDir / "compiled" / toolName / (stem + ".py")
 
 	def getSource(self, grammarResources: "InMemoryGrammarResources") -> "ast.Module":
 		"""Must return source code of the grammar in its DSL"""
-		return grammarResources.parent.backendsPythonAST[self.__class__.META.product.name, grammarResources.name]
+		return grammarResources.parent.backendsPythonAST[self.getSourceKey(grammarResources)]
 
+	def getGrammarFiles(self, grammarResources: "InMemoryGrammarResources") -> typing.Iterable[Path]:
+		"""Returns the paths of the files of the grammar within the bundle this factory reads"""
+		return (self.getSourcePath(grammarResources),)
 
-class IParserFactoryFromPrecompiledOrSource(IParserFactoryFromSourceCore):
+
+class IParserFactoryFromPrecompiledOrSource(IParserFactoryFromSourceCore, ParserOptionsMixin):
 	"""Hybrid between `IParserFromPrecompiled` and `IParserFromSource`:
 		tries to find and use precompiled file first,
 		if there is no, tries to find and use source
@@ -108,13 +164,18 @@ class IParserFactoryFromPrecompiledOrSource(IParserFactoryFromSourceCore):
 			self._source = res = self.__class__.SOURCE()
 		return res
 
-	def fromBundle(self, grammarResources: "InMemoryGrammarResources"):
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None):
 		"""tries to find and use precompiled file first,
 		if there is no, tries to find and use source"""
 		try:
-			return self.precompiled.fromBundle(grammarResources)
+			res = self.precompiled.fromBundle(grammarResources)
 		except FileNotFoundError:
-			return self.source.fromBundle(grammarResources)
+			res = self.source.fromBundle(grammarResources)
+		return self.applyOptions(res, options)
+
+	def getGrammarFiles(self, grammarResources: "InMemoryGrammarResources") -> typing.Iterable[Path]:
+		"""Both the precompiled file and the source one, whichever is present is used"""
+		return tuple(self.precompiled.getGrammarFiles(grammarResources)) + tuple(self.source.getGrammarFiles(grammarResources))
 
 	def compileStr(self, grammarText: str, target: typing.Any = None, fileName: typing.Optional[typing.Union[Path, str]] = None):
 		"""Proxies to the factory defined by `SOURCE`"""
@@ -1,5 +1,10 @@
 import typing
 from abc import ABCMeta, abstractmethod
+from enum import Enum
+
+from .ParserOptions import ParserOptions
+from .SchemaIndex import SchemaIndex
+from .utils import BufferT, decodeBuffer
 
 backendsRegistry = {}
 
@@ -8,6 +13,31 @@ class ParserNotFoundException(Exception):
 	"""Means that not all parser components have been found"""
 
 
+class ErrorPolicy(Enum):
+	"""What to do with an item of a batch which processing has failed"""
+
+	reraise = 0
+	skip = 1
+	yieldException = 2
+
+
+def mapWithErrorPolicy(func: typing.Callable[[typing.Any], typing.Any], items: typing.Iterable[typing.Any], exClass: typing.Type[Exception], errorPolicy: ErrorPolicy) -> typing.Iterator[typing.Any]:
+	"""Lazily applies `func` to `items`, handling `exClass` exceptions according to `errorPolicy`"""
+	if errorPolicy is ErrorPolicy.reraise:
+		yield from map(func, items)
+		return
+
+	skip = errorPolicy is ErrorPolicy.skip
+	for it in items:
+		try:
+			res = func(it)
+		except exClass as ex:
+			if skip:
+				continue
+			res = ex
+		yield res
+
+
 class IParsingBackendMeta(ABCMeta):
 	__slots__ = ()
 
@@ -63,6 +93,137 @@ class ToolSpecificGrammarASTWalkStrategy:
 		return optional
 
 
+class IterativeASTTransformer:
+	"""Transforms a tool-specific AST in post-order (children before their parents) in a single pass.
+	Uses an explicit stack instead of recursion, so deeply nested inputs don't hit the recursion limit.
+	The mappings from `capSchema` and `iterSchema` are taken from a `SchemaIndex` built once per grammar."""
+
+	__slots__ = ("capSchema", "iterables")
+
+	def __init__(self, schemaIndex: SchemaIndex) -> None:
+		self.capSchema = schemaIndex.capSchema
+		self.iterables = schemaIndex.iterables
+
+	def isLeaf(self, node: typing.Any) -> bool:
+		"""Returns if a node has no children to transform"""
+		raise NotImplementedError
+
+	def transformLeaf(self, node: typing.Any) -> typing.Any:
+		return node
+
+	def getChildren(self, node: typing.Any) -> typing.Sequence[typing.Any]:
+		raise NotImplementedError
+
+	def transformNode(self, node: typing.Any, children: typing.Sequence[typing.Any], newChildren: typing.List[typing.Any]) -> typing.Any:
+		"""Transforms a non-leaf node. `children` are the ones returned by `getChildren`, `newChildren` are their transformed counterparts."""
+		raise NotImplementedError
+
+	def __call__(self, root: typing.Any) -> typing.Any:
+		isLeaf = self.isLeaf
+		transformLeaf = self.transformLeaf
+		getChildren = self.getChildren
+		transformNode = self.transformNode
+
+		if isLeaf(root):
+			return transformLeaf(root)
+
+		children = getChildren(root)
+		stack = [(root, children, iter(children), [])]
+		while True:
+			node, children, childrenIter, newChildren = stack[-1]
+			for child in childrenIter:
+				if isLeaf(child):
+					newChildren.append(transformLeaf(child))
+				else:
+					grandChildren = getChildren(child)
+					stack.append((child, grandChildren, iter(grandChildren), []))
+					break
+			else:
+				stack.pop()
+				res = transformNode(node, children, newChildren)
+				if not stack:
+					return res
+				stack[-1][3].append(res)
+
+
+class InPlaceASTTransformer(IterativeASTTransformer):
+	"""For the tools which nodes are transformed in place: `children` of a node are replaced with a container with named access and the class of the node is replaced.
+	Supports lazy transformation: the nodes are transformed only when they are accessed, so there is no separate pass over the whole tree. When a node is transformed, its children get the lazy variants of their final classes, so `isinstance` checks in walk strategies work without transforming them."""
+
+	__slots__ = ("lazyClasses",)
+
+	def __init__(self, schemaIndex: SchemaIndex) -> None:
+		super().__init__(schemaIndex)
+		self.lazyClasses = {}
+
+	def getTransformedClass(self, node: typing.Any, children: typing.Sequence[typing.Any]) -> type:
+		"""Returns the class the node must have after transformation. Must not rely on transformed children."""
+		raise NotImplementedError
+
+	def transformChildren(self, node: typing.Any, children: typing.Sequence[typing.Any], transformedClass: type) -> typing.Any:
+		"""Returns the container of children to replace `node.children`"""
+		raise NotImplementedError
+
+	def transformNode(self, node: typing.Any, children: typing.Sequence[typing.Any], newChildren: typing.List[typing.Any]) -> typing.Any:
+		transformedClass = self.getTransformedClass(node, children)
+		node.children = self.transformChildren(node, children, transformedClass)
+		node.__class__ = transformedClass
+		return node
+
+	def getLazyClass(self, transformedClass: type) -> type:
+		res = self.lazyClasses.get(transformedClass, None)
+		if res is None:
+			self.lazyClasses[transformedClass] = res = self._makeLazyClass(transformedClass)
+		return res
+
+	def _makeLazyClass(self, transformedClass: type) -> type:
+		transformer = self
+
+		class Lazy(transformedClass):  # pylint:disable=too-few-public-methods
+			__slots__ = ()
+
+			@property
+			def children(self) -> typing.Any:
+				# walk strategies access `children` directly, it is a real attribute, so `__getattr__` is not called for it
+				transformer.materialize(self, transformedClass)
+				return self.children
+
+			def __getattr__(self, k: str) -> typing.Any:
+				transformer.materialize(self, transformedClass)
+				return getattr(self, k)
+
+			def __getitem__(self, k: typing.Union[int, str]) -> typing.Any:
+				transformer.materialize(self, transformedClass)
+				return self[k]
+
+			def __iter__(self):
+				transformer.materialize(self, transformedClass)
+				return iter(self)
+
+		Lazy.__name__ = Lazy.__qualname__ = "Lazy" + transformedClass.__name__
+		return Lazy
+
+	def materialize(self, node: typing.Any, transformedClass: type) -> None:
+		"""Transforms a single node which class is a lazy one"""
+		node.__class__ = transformedClass  # first, in order the raw `children` to be accessible, they are shadowed by the property of the lazy class
+		children = self.getChildren(node)
+		node.children = self.transformChildren(node, children, transformedClass)
+
+		isLeaf = self.isLeaf
+		getChildren = self.getChildren
+		getTransformedClass = self.getTransformedClass
+		for child in children:
+			if not isLeaf(child):
+				child.__class__ = self.getLazyClass(getTransformedClass(child, getChildren(child)))
+
+	def transformLazily(self, root: typing.Any) -> typing.Any:
+		if self.isLeaf(root):
+			return self.transformLeaf(root)
+
+		root.__class__ = self.getLazyClass(self.getTransformedClass(root, self.getChildren(root)))
+		return root
+
+
 class IParsingBackend(metaclass=IParsingBackendMeta):
 	"""A class commanding the parsing. Calls the generated parser and postprocesses its output"""
 
@@ -79,11 +240,19 @@ class IParsingBackend(metaclass=IParsingBackendMeta):
 	EX_CLASS = Exception
 	ITER_INTROSPECTION = True
 	CAP_INTROSPECTION = True
+	ACCEPTS_BUFFERS = False  # if the parser can consume `bytes`-like objects directly, without decoding them into `str`
+	ENCODING = "utf-8"
+	SCHEMA_INDEX = SchemaIndex  # type: typing.Type[SchemaIndex]
+	PARSER_OPTIONS = frozenset()  # type: typing.FrozenSet[str]  # names of the `ParserOptions` the parser factory applies
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		self.parser = self.__class__.PARSER().fromBundle(grammarResources)
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		self.parser = self.createParser(grammarResources, options)
 		self.wstr = self.__class__.WSTR(self.__class__)
 
+	def createParser(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> "IParser":
+		"""Creates the parser from the bundle. Overridden by the backends which need to configure the factory."""
+		return self.__class__.PARSER().fromBundle(grammarResources, options)
+
 	def _getSubTreeText(self, lst: typing.Any) -> typing.Iterator[str]:
 		if self.wstr.isCollection(lst):
 			for t in self.wstr.iterateCollection(lst):
@@ -112,8 +281,28 @@ class IParsingBackend(metaclass=IParsingBackendMeta):
 	def preprocessAST(self, ast: typing.Any) -> typing.Any:
 		return ast
 
+	def preprocessASTLazily(self, ast: typing.Any) -> typing.Any:
+		"""Like `preprocessAST`, but the nodes are postprocessed only when they are accessed, so a wrapper walks the backend-native AST without a separate pass over it. The backends not supporting it just call `preprocessAST`."""
+		return self.preprocessAST(ast)
+
 	def parse(self, s: str) -> typing.Any:
 		return self.parser(s)
 
+	def parseBuffer(self, buf: BufferT) -> typing.Any:
+		"""Parses a `bytes`-like object (`bytes`, `memoryview`, `mmap`). If the parser cannot consume it directly, it is decoded."""
+		if self.__class__.ACCEPTS_BUFFERS:
+			return self.parse(buf)
+		return self.parse(decodeBuffer(buf, self.__class__.ENCODING))
+
+	def parseAny(self, s: typing.Union[str, BufferT]) -> typing.Any:
+		"""Parses either a `str` or a `bytes`-like object"""
+		if isinstance(s, str):
+			return self.parse(s)
+		return self.parseBuffer(s)
+
+	def parseMany(self, strs: typing.Iterable[typing.Union[str, BufferT]], errorPolicy: ErrorPolicy = ErrorPolicy.reraise) -> typing.Iterator[typing.Any]:
+		"""Lazily parses each of `strs` into backend-native AST"""
+		return mapWithErrorPolicy(self.parseAny, strs, self.__class__.EX_CLASS or Exception, errorPolicy)
+
 	def terminalNodeToStr(self, token: typing.Optional[typing.Any]) -> typing.Optional[typing.Any]:
 		return token
@@ -1,6 +1,9 @@
 import typing
 from abc import ABC
 
+from .IParsingBackend import ErrorPolicy, mapWithErrorPolicy
+from .utils import BufferT, iterRecords
+
 # pylint:disable=too-few-public-methods
 
 
@@ -22,13 +25,36 @@ class IParseResult:
 
 
 class IWrapper(ABC):
-	__slots__ = ("backend",)
+	__slots__ = ("backend", "preprocessAST")
 
 	__MAIN_PRODUCTION__ = None
 
-	def __init__(self, backend):
+	def __init__(self, backend, lazy: bool = False):
+		"""`lazy` makes the backend-native AST nodes to be postprocessed only when the wrapper accesses them, without a separate pass over the whole tree (if the backend supports it)"""
 		self.backend = backend
+		self.preprocessAST = backend.preprocessASTLazily if lazy else backend.preprocessAST
 
-	def __call__(self, s: str) -> typing.Union[typing.Iterable[IParseResult], IParseResult]:
-		preprocessed = self.backend.preprocessAST(self.backend.parse(s))
+	def __call__(self, s: typing.Union[str, BufferT]) -> typing.Union[typing.Iterable[IParseResult], IParseResult]:
+		backend = self.backend
+		preprocessed = self.preprocessAST(backend.parse(s) if isinstance(s, str) else backend.parseBuffer(s))
 		return self.__MAIN_PRODUCTION__(preprocessed)
+
+	def map(self, strs: typing.Iterable[typing.Union[str, BufferT]], errorPolicy: ErrorPolicy = ErrorPolicy.reraise) -> typing.Iterator[typing.Union[typing.Iterable[IParseResult], IParseResult, Exception]]:
+		"""Lazily parses each of `strs`. Equivalent to `map(self, strs)`, but the attributes are looked up only once for the whole batch."""
+		backend = self.backend
+		parse = backend.parse
+		parseBuffer = backend.parseBuffer
+		preprocessAST = self.preprocessAST
+		mainProduction = self.__MAIN_PRODUCTION__
+
+		def processSingle(s: typing.Union[str, BufferT]):
+			return mainProduction(preprocessAST(parse(s) if isinstance(s, str) else parseBuffer(s)))
+
+		return mapWithErrorPolicy(processSingle, strs, backend.__class__.EX_CLASS or Exception, errorPolicy)
+
+	def stream(self, source: typing.Union[typing.IO, BufferT, typing.Iterable[typing.Union[str, BufferT]]], boundary: str = "\n", errorPolicy: ErrorPolicy = ErrorPolicy.reraise, chunkSize: int = 1 << 16, skipEmpty: bool = True) -> typing.Iterator[typing.Union[typing.Iterable[IParseResult], IParseResult, Exception]]:
+		"""Lazily parses a stream of records separated by `boundary`, for grammars describing a single record. `source` is either a file-like object, or a `bytes`-like object (i.e. `mmap`), or an iterable of chunks, it is never loaded (or decoded) into memory whole."""
+		records = iterRecords(source, boundary, chunkSize, self.backend.__class__.ENCODING)
+		if skipEmpty:
+			records = filter(None, records)
+		return self.map(records, errorPolicy)
@@ -0,0 +1,68 @@
+import typing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count
+from pathlib import Path
+
+from .IParsingBackend import ErrorPolicy
+from .IWrapper import IParseResult
+from .utils import chunked
+
+_workerWrapper = None
+
+
+def _initWorker(bundleDir: Path, grammarName: str, backendName: str, useCompiledCache: bool) -> None:
+	"""Constructs the wrapper once per worker process"""
+	global _workerWrapper  # pylint:disable=global-statement
+	from .ParserBundle import ParserBundle  # pylint:disable=import-outside-toplevel
+
+	_workerWrapper = ParserBundle(bundleDir, useCompiledCache).grammars[grammarName].getWrapper(backendName)
+
+
+def _parseChunk(chunk: typing.List[str], errorPolicy: ErrorPolicy) -> typing.List[typing.Any]:
+	return list(_workerWrapper.map(chunk, errorPolicy))
+
+
+class ParallelWrapper:
+	"""Parses in a pool of processes, since all the backends are pure-python and are bound by GIL.
+	Each worker reconstructs the bundle from its dir and the wrapper for the grammar once on startup, then parses chunks of inputs and sends back the postprocessed results."""
+
+	__slots__ = ("pool", "chunkSize", "maxChunksInFlight")
+
+	def __init__(self, grammarResources: "InMemoryGrammarResources", backendName: typing.Optional[str] = None, workers: typing.Optional[int] = None, chunkSize: int = 256) -> None:
+		if backendName is None:
+			# resolved here in order all the workers to use the same backend
+			backendName = grammarResources.getFastestBackendName()
+
+		if workers is None:
+			workers = cpu_count() or 1
+
+		# the classes of results are defined in the wrapper module, it must be registered in `sys.modules` of this process to unpickle them
+		grammarResources.wrapperClass  # pylint:disable=pointless-statement
+
+		bundle = grammarResources.parent
+		self.pool = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(bundle.bundleDir, grammarResources.name, backendName, bundle.compiledCache is not None))
+		self.chunkSize = chunkSize
+		self.maxChunksInFlight = 2 * workers
+
+	def map(self, strs: typing.Iterable[str], errorPolicy: ErrorPolicy = ErrorPolicy.reraise) -> typing.Iterator[typing.Union[typing.Iterable[IParseResult], IParseResult, Exception]]:
+		"""Lazily parses each of `strs`, preserving the order. Only a bounded count of chunks is submitted to the pool at once, so `strs` can be a very long iterator."""
+		func = partial(_parseChunk, errorPolicy=errorPolicy)
+		inFlight = deque()
+		for chunk in chunked(strs, self.chunkSize):
+			inFlight.append(self.pool.submit(func, chunk))
+			if len(inFlight) >= self.maxChunksInFlight:
+				yield from inFlight.popleft().result()
+
+		while inFlight:
+			yield from inFlight.popleft().result()
+
+	def close(self) -> None:
+		self.pool.shutdown()
+
+	def __enter__(self) -> "ParallelWrapper":
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+		self.close()
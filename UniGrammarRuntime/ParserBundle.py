@@ -1,5 +1,6 @@
 import typing
 from collections import defaultdict
+from hashlib import sha256
 from pathlib import Path
 from warnings import warn
 
@@ -17,10 +18,12 @@ from urm.ProtoBundle import ProtoBundle
 from urm.storers.cold import FileSaver
 from urm.storers.hot import PrefixCacher
 
-from . import backends  # pylint:disable=unused-import # Imports all the stuff this way creating classes auto-registered to the registry via a metaclass
-from .benchmark import BenchmarkData, benchmark
-from .IParsingBackend import backendsRegistry
-from .utils import getPythonModule
+from .backends import getBackendClass
+from .benchmark import SCALES, BenchmarkData, benchmark, benchmarkScaling
+from .CompiledCache import CompiledCache, hashSource
+from .ParserOptions import ParserOptions, parseBackendSpec
+from .SchemaIndex import SchemaIndex
+from .utils import LRUCache, execPythonCode, getDistributionVersion, getPythonModule
 
 #fileSaverIGR = FileSaver(Dynamic(("parent", "bundleDir")), Dynamic(("parent", "serializer", "fileExtension")))
 fileSaverIGR = FileSaver(Dynamic(("parent", "bundleDir")), "json")
@@ -47,7 +50,9 @@ pythonASTSerializerMapper = JustReturnSerializerMapper(utf8Transformer + pythonA
 
 
 class InMemoryGrammarResources(ProtoBundle):
-	__slots__ = ("parent", "name", "_backendsData", "_metrics", "_capSchema", "_iterSchema", "_wraperClass")
+	__slots__ = ("parent", "name", "_backendsData", "_metrics", "_capSchema", "_iterSchema", "_wraperClass", "_backendsCache", "_fastestBackendName", "_schemaIndexes")
+
+	BACKENDS_CACHE_SIZE = 8  # max count of backends (and so compiled parsers) kept alive per grammar
 
 	capSchema = Field0D(ColdMapper(PrefixKeyMapper("schemas", "capless", nameD), fileSaverIGR, constantParamsSerializerMapper), ourCacher)
 	iterSchema = Field0D(ColdMapper(PrefixKeyMapper("schemas", "iterless", nameD), fileSaverIGR, constantParamsSerializerMapper), ourCacher)
@@ -63,9 +68,56 @@ class InMemoryGrammarResources(ProtoBundle):
 		self._iterSchema = None
 		self._wraperClass = None
 		self._metrics = None
+		self._backendsCache = LRUCache(self.__class__.BACKENDS_CACHE_SIZE)
+		self._fastestBackendName = None
+		self._schemaIndexes = {}
+
+	def getSchemaIndex(self, indexClass: typing.Type[SchemaIndex] = SchemaIndex) -> SchemaIndex:
+		"""Returns `capSchema` and `iterSchema` compiled into an index for AST transformers. It is built once per grammar for each class of index and is shared between backends."""
+		res = self._schemaIndexes.get(indexClass, None)
+		if res is None:
+			self._schemaIndexes[indexClass] = res = indexClass(self.capSchema, self.iterSchema)
+		return res
+
+	def getWrapperModuleName(self) -> str:
+		"""The name the wrapper module is registered in `sys.modules` under. It depends only on the bundle location and the grammar name, so it is the same in every process and parse results can be pickled between them."""
+		return "_UniGrammarWrapper_" + hashSource(str(Path(self.parent.bundleDir).absolute()))[:16] + "_" + self.name
+
+	def getWrapperPath(self) -> Path:
+		return self.parent.bundleDir / self.__class__.wrapperAST.strategy.cold.key.prefix[0] / (self.name + ".py")
+
+	def getBackendVersion(self, backendName: str) -> str:
+		"""Returns a hash of the files of the grammar for a backend, of the wrapper and of the version of the tool. When it changes, benchmark results for the backend are outdated."""
+		backendName = parseBackendSpec(backendName)[0]
+		factory = self.parent.backends[backendName].PARSER()
+		toolName = factory.__class__.META.product.name
+
+		files = [self.getWrapperPath()]
+		files.extend(factory.getGrammarFiles(self))
+
+		res = sha256(str(getDistributionVersion(toolName)).encode("utf-8"))
+		for p in files:
+			try:
+				data = p.read_bytes()
+			except FileNotFoundError:
+				continue
+			res.update(p.name.encode("utf-8"))
+			res.update(data)
+		return res.hexdigest()
 
 	def getWrapperModule(self):
-		return getPythonModule(self.wrapperAST, self.parent.bundleDir / self.__class__.wrapperAST.strategy.cold.key.prefix[0] / (self.name + ".py"))
+		fileName = self.getWrapperPath()
+		moduleName = self.getWrapperModuleName()
+		cache = self.parent.compiledCache
+		if cache is not None:
+			try:
+				source = fileName.read_bytes()
+			except FileNotFoundError:
+				pass
+			else:
+				return execPythonCode(cache.getOrCompileCode(source, lambda: self.wrapperAST, fileName), moduleName)
+
+		return getPythonModule(self.wrapperAST, fileName, moduleName)
 
 	@property
 	def wrapperClass(self):
@@ -74,40 +126,111 @@ class InMemoryGrammarResources(ProtoBundle):
 			self._wraperClass = res = self.getWrapperModule()["__MAIN_PARSER__"]
 		return res
 
-	def getWrapper(self, backendName: typing.Optional[str] = None):
-		return self.wrapperClass(self.getBackend(backendName))
+	def getWrapper(self, backendName: typing.Optional[str] = None, lazy: bool = False, options: typing.Optional[ParserOptions] = None):
+		return self.wrapperClass(self.getBackend(backendName, options), lazy)
+
+	def getParallelWrapper(self, backendName: typing.Optional[str] = None, workers: typing.Optional[int] = None, chunkSize: int = 256) -> "ParallelWrapper":
+		"""Returns a wrapper parsing in a pool of `workers` processes"""
+		from .ParallelWrapper import ParallelWrapper  # pylint:disable=import-outside-toplevel
+
+		return ParallelWrapper(self, backendName, workers, chunkSize)
+
+	def getAdaptiveWrapper(self, lazy: bool = False, criteria=None, stat: str = "min") -> "AdaptiveWrapper":
+		"""Returns a wrapper choosing a backend for each input by its length, according to the crossovers learned from `metrics`"""
+		from .AdaptiveWrapper import AdaptiveWrapper  # pylint:disable=import-outside-toplevel
+
+		return AdaptiveWrapper(self, lazy, *self.metrics.getCrossovers(criteria, stat))
 
 	#def __repr__(self):
 	#	return self.__class__.__name__ + "<backends: " + repr(list(self.backendsData)) + ", iterSchema " + ("present" if self.iterSchema else "missing") + ", capSchema " + ("present" if self.capSchema else "missing") + ">"
 
-	def getBackend(self, backendName: typing.Optional[str] = None):
+	def getBackend(self, backendName: typing.Optional[str] = None, options: typing.Optional[ParserOptions] = None):
+		"""Returns a backend for the grammar. Backends are cached, so the grammar is compiled only on the first call for each backend and options.
+		`backendName` can also be a spec with options, like `arpeggio[memoization=False]`, as returned by `getFastestBackendName`. `options` override the ones from spec."""
 		if backendName is None:
-			backendName = self.getFastestBackendName()
-		print(self.parent.backends[backendName])
-		return self.parent.backends[backendName](self)
+			backendName = self._fastestBackendName
+			if backendName is None:
+				self._fastestBackendName = backendName = self.getFastestBackendName()
+
+		backendName, specOptions = parseBackendSpec(backendName)
+		if options is None:
+			options = specOptions
+		backendClass = self.parent.backends[backendName]
+		if options is not None:
+			options = options.restrict(backendClass.PARSER_OPTIONS)  # the unsupported ones are ignored by the backend, so they must not produce distinct cache entries
+		key = (backendName, options or None)  # options with nothing set are the same as no options
+
+		try:
+			return self._backendsCache[key]
+		except KeyError:
+			pass
+
+		self._backendsCache[key] = res = backendClass(self, options)
+		return res
 
-	def getFastestBackendName(self, criteria=None):
-		fastestMetrics = self.metrics.getFastest(criteria)
+	def invalidateBackends(self, backendName: typing.Optional[str] = None) -> None:
+		"""Drops the cached backend (with all options), so it is reconstructed from the bundle on the next `getBackend` call. `None` drops all of them and the schema indexes."""
+		if backendName is None:
+			self._backendsCache.clear()
+			self._fastestBackendName = None
+			self._schemaIndexes.clear()
+		else:
+			for key in [key for key in self._backendsCache.keys() if key[0] == backendName]:
+				del self._backendsCache[key]
+			if self._fastestBackendName is not None and parseBackendSpec(self._fastestBackendName)[0] == backendName:
+				self._fastestBackendName = None
+
+	def getFastestBackendName(self, criteria=None, stat: str = "min", weights: typing.Optional[typing.Mapping[str, float]] = None, perKB: bool = False):
+		fastestMetrics = self.metrics.getFastest(criteria, stat, weights, perKB)
 		fastestBackendName = fastestMetrics[0]
 		return fastestBackendName
 
-	def benchmark(self, testData: typing.Iterable[str], backendNames: str = None, timeBudget: float = 10, benchmarkModes=None, smallCount=100):
+	def benchmark(self, testData: typing.Iterable[str], backendNames: str = None, timeBudget: float = 10, benchmarkModes=None, smallCount=100, parserOptions: typing.Optional[typing.Iterable[typing.Optional[ParserOptions]]] = None, parallel: bool = False, workers: typing.Optional[int] = None, prevRes: typing.Optional[BenchmarkData] = None):
+		"""`parserOptions` are the variants of options to sweep, each backend is benchmarked with each of them it supports.
+		`parallel` makes independent measurements to run simultaneously in `workers` processes pinned to CPUs.
+		With `prevRes` only missing and outdated results are measured, the rest are taken from it."""
 
 		if isinstance(backendNames, str):
 			backendNames = (backendNames,)
 		elif backendNames is None:
 			backendNames = tuple(self.parent.backends.keys())
 
-		return benchmark(self, testData, backendNames, timeBudget, benchmarkModes, smallCount)
+		return benchmark(self, testData, backendNames, timeBudget, benchmarkModes, smallCount, prevRes=prevRes, parserOptions=parserOptions, parallel=parallel, workers=workers)
 
 	def benchmarkAndUpdate(self, *args, **kwargs):
+		"""Benchmarks and merges the results into the stored `metrics`, so only what is missing there or is outdated is measured"""
+		if kwargs.get("prevRes", None) is None:
+			try:
+				kwargs["prevRes"] = self.metrics
+			except FileNotFoundError:
+				pass
 		metrics = self.benchmark(*args, **kwargs)
 		self.metrics = metrics
+		self._fastestBackendName = None
 		#self.save("metrics")
 		return metrics
 
 	benchmarkAndUpdate.__wraps__ = benchmark
 
+	def benchmarkScalingAndUpdate(self, seed: typing.Union[str, typing.Callable[[int], str]], backendNames: str = None, timeBudget: float = 10, scales: typing.Iterable[int] = SCALES, separator: str = "", criteria=None, stat: str = "min", smallCount: int = 100, parallel: bool = False, workers: typing.Optional[int] = None):
+		"""Fits complexity curves of backends with `benchmarkScaling` and stores them into `metrics` next to the benchmark results"""
+		if isinstance(backendNames, str):
+			backendNames = (backendNames,)
+		elif backendNames is None:
+			backendNames = tuple(self.parent.backends.keys())
+
+		scaling = benchmarkScaling(self, seed, backendNames, timeBudget, scales, separator, criteria, stat, smallCount, parallel, workers)
+
+		try:
+			metrics = self.metrics
+		except FileNotFoundError:
+			metrics = BenchmarkData((), (), ())
+
+		metrics.updateVersions({backendName: self.getBackendVersion(backendName) for backendName in scaling})  # drops the outdated results before they are mixed with the new ones
+		metrics.scaling.update(scaling)
+		self.metrics = metrics
+		return scaling
+
 
 class GrammarsCollection:
 	"""Fuck that `defaultdict` that doesn't have arguments"""
@@ -144,7 +267,7 @@ compiledMapperColdSaver = FileSaver(parseBundleCompiledParentDir, None)
 class ParserBundle(ProtoBundle):
 	"""A class to manage components of a parser"""
 
-	__slots__ = ("backends", "grammars", "bundleDir")
+	__slots__ = ("backends", "grammars", "bundleDir", "compiledCache")
 
 	serializer = utf8Transformer + jsonFancySerializer
 
@@ -152,8 +275,10 @@ class ParserBundle(ProtoBundle):
 	backendsTextData = FieldND(ColdMapper(parseBundleCompiledKeyMapper, compiledMapperColdSaver, JustReturnSerializerMapper(utf8Transformer)))
 	backendsPythonAST = FieldND(ColdMapper(parseBundleCompiledKeyMapper, FileSaver(parseBundleCompiledParentDir, "py"), pythonASTSerializerMapper))
 
-	def __init__(self, path: typing.Optional[Path] = None) -> None:
+	def __init__(self, path: typing.Optional[Path] = None, useCompiledCache: bool = False) -> None:
+		"""`useCompiledCache` enables storing compiled grammars into `cache` dir within the bundle, so the following processes don't have to compile them again"""
 		self.bundleDir = path
+		self.compiledCache = CompiledCache(path / "cache") if useCompiledCache and path is not None else None
 		self.initBackends()
 		self.grammars = GrammarsCollection(self)
 
@@ -163,8 +288,9 @@ class ParserBundle(ProtoBundle):
 	def discoverBackends(self) -> None:
 		"""Used to discover backends for which parsers are present in a bundle"""
 		for name in self._discoverBackends():
-			if name in backendsRegistry:
-				yield backendsRegistry[name]
+			backendClass = getBackendClass(name)
+			if backendClass is not None:
+				yield backendClass
 			else:
 				warn("Backend " + name + " is not in the registry, skipping")
 
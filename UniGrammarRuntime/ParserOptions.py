@@ -0,0 +1,90 @@
+import typing
+from ast import literal_eval
+
+
+class ParserOptions:
+	"""Tool-independent settings of generated parsers. `None` means the default of the tool. A backend applies only the options listed in its `PARSER_OPTIONS`, the rest are ignored.
+		* `memoization` - packrat memoization of results of parsing expressions. Makes backtracking cheap, but costs memory proportional to the input size;
+		* `cacheSizeLimit` - max count of memoized results per expression, the oldest ones are evicted;
+		* `leftRecursion` - support of left-recursive rules.
+	"""
+
+	__slots__ = ("memoization", "cacheSizeLimit", "leftRecursion")
+
+	def __init__(self, memoization: typing.Optional[bool] = None, cacheSizeLimit: typing.Optional[int] = None, leftRecursion: typing.Optional[bool] = None) -> None:
+		self.memoization = memoization
+		self.cacheSizeLimit = cacheSizeLimit
+		self.leftRecursion = leftRecursion
+
+	def __iter__(self):
+		for k in __class__.__slots__:  # pylint:disable=undefined-variable
+			yield getattr(self, k)
+
+	def items(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+		"""Only the options which are set"""
+		for k in __class__.__slots__:  # pylint:disable=undefined-variable
+			v = getattr(self, k)
+			if v is not None:
+				yield k, v
+
+	def toTuple(self):
+		return tuple(self)
+
+	def __bool__(self) -> bool:
+		return any(v is not None for v in self)
+
+	def __eq__(self, other: typing.Any) -> bool:
+		if not isinstance(other, __class__):  # pylint:disable=undefined-variable
+			return NotImplemented
+		return self.toTuple() == other.toTuple()
+
+	def __hash__(self) -> int:
+		return hash(self.toTuple())
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + ", ".join(k + "=" + repr(v) for k, v in self.items()) + ")"
+
+	def restrict(self, names: typing.Collection[str]) -> "ParserOptions":
+		"""Returns a copy with only the options from `names`"""
+		return self.__class__(**{k: v for k, v in self.items() if k in names})
+
+
+def makeBackendSpec(backendName: str, options: typing.Optional[ParserOptions] = None) -> str:
+	"""Makes a string identifying both a backend and the options of its parser, like `arpeggio[memoization=False]`. Used as a name of a backend in benchmark results, so the fastest combination can be passed to `getBackend` as it is."""
+	if not options:
+		return backendName
+	return backendName + "[" + ",".join(k + "=" + repr(v) for k, v in options.items()) + "]"
+
+
+def parseBackendSpec(spec: str) -> typing.Tuple[str, typing.Optional[ParserOptions]]:
+	"""Inverse of `makeBackendSpec`"""
+	backendName, sep, rest = spec.partition("[")
+	if not sep:
+		return spec, None
+
+	if rest[-1:] != "]":
+		raise ValueError("Invalid backend spec", spec)
+
+	kwargs = {}
+	for pair in rest[:-1].split(","):
+		k, sep, v = pair.partition("=")
+		if not sep or k not in ParserOptions.__slots__:
+			raise ValueError("Invalid parser option in backend spec", spec, pair)
+		kwargs[k] = literal_eval(v)
+
+	return backendName, ParserOptions(**kwargs)
+
+
+def sweepBackendSpecs(backendNames: typing.Iterable[str], optionsVariants: typing.Iterable[typing.Optional[ParserOptions]], getSupportedOptions: typing.Callable[[str], typing.Collection[str]]) -> typing.Iterator[str]:
+	"""Generates the specs of all the combinations of backends and options. The options unsupported by a backend are dropped, so the combinations equal for it are generated only once."""
+	optionsVariants = tuple(optionsVariants)
+	for backendName in backendNames:
+		supported = getSupportedOptions(backendName)
+		seen = set()
+		for options in optionsVariants:
+			if options is not None:
+				options = options.restrict(supported)
+			spec = makeBackendSpec(backendName, options)
+			if spec not in seen:
+				seen.add(spec)
+				yield spec
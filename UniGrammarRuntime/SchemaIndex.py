@@ -0,0 +1,42 @@
+import typing
+
+CapSchemaT = typing.Dict[str, typing.Dict[str, str]]
+
+
+class SchemaIndex:
+	"""`capSchema` and `iterSchema` compiled into the structures for the hot paths of AST transformers: a set of productions being collections and a table of children names per production.
+	Some tools mangle productions names, such mangled variants are added into the index too, so a transformer needs a single lookup per node.
+	Is built once per grammar for each subclass by `InMemoryGrammarResources.getSchemaIndex`."""
+
+	__slots__ = ("capSchema", "iterables")
+
+	def __init__(self, capSchema: typing.Optional[CapSchemaT], iterSchema: typing.Optional[typing.Iterable[str]]) -> None:
+		if capSchema:
+			self.capSchema = self.__class__._addVariantsKeys({prodName: self.__class__._addVariantsKeys(mapping) for prodName, mapping in capSchema.items()})
+		else:
+			self.capSchema = {}
+
+		if iterSchema:
+			self.iterables = frozenset(self.__class__._addVariants(iterSchema))
+		else:
+			self.iterables = frozenset()
+
+	@classmethod
+	def getNameVariants(cls, name: str) -> typing.Iterable[str]:
+		"""Returns the names other than `name` a tool may call a production with"""
+		return ()
+
+	@classmethod
+	def _addVariants(cls, names: typing.Iterable[str]) -> typing.Iterator[str]:
+		for n in names:
+			yield n
+			yield from cls.getNameVariants(n)
+
+	@classmethod
+	def _addVariantsKeys(cls, d: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+		res = {}
+		for k, v in d.items():
+			for vk in cls.getNameVariants(k):
+				res.setdefault(vk, v)
+		res.update(d)  # the exact names have priority
+		return res
@@ -1,2 +1,27 @@
-from .multilanguage import antlr4, waxeye
-from .python import TatSu, arpeggio, parglare, parsimonious
+import typing
+from importlib import import_module
+
+from ..IParsingBackend import IParsingBackend, backendsRegistry
+
+# Backends modules are imported only when a backend is requested, since importing them is not free (and ANTLR one warns if antlrCompile is not installed). The classes within register themselves into `backendsRegistry` via the metaclass.
+backendsModules = {
+	"antlr4": ".multilanguage.antlr4",
+	"waxeye": ".multilanguage.waxeye",
+	"TatSu": ".python.TatSu",
+	"arpeggio": ".python.arpeggio",
+	"lark": ".python.lark",
+	"parglare": ".python.parglare",
+	"parsimonious": ".python.parsimonious",
+	"py_re": ".regExps.python",
+}
+
+
+def getBackendClass(name: str) -> typing.Optional[typing.Type[IParsingBackend]]:
+	"""Returns the class of a backend by the name of its tool, importing its module if needed. Returns `None` for unknown backends."""
+	res = backendsRegistry.get(name, None)
+	if res is None:
+		moduleName = backendsModules.get(name, None)
+		if moduleName is not None:
+			import_module(moduleName, __name__)
+			res = backendsRegistry.get(name, None)
+	return res
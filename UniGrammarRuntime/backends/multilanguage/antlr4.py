@@ -1,7 +1,9 @@
 import typing
+from pathlib import Path
 
 from ...grammarClasses import LL
 from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
 
 try:
@@ -68,11 +70,16 @@ class ANTLRParserFactory(ANTLRCompileANTLRParserFactory):
 
 	antlr4 = None
 
-	def fromBundle(self, grammarResources: "InMemoryGrammarResources") -> "antlrCompile.core.ANTLRParser":
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> "antlrCompile.core.ANTLRParser":
 		pythonBackend = backendsPool(ANTLRInternalClassesPython)
 		self.__class__.antlr4 = pythonBackend.antlr4
 		return self._fromAttrIterable(pythonBackend, self._bundleToIterable(pythonBackend, grammarResources))
 
+	def getGrammarFiles(self, grammarResources: "InMemoryGrammarResources") -> typing.Iterable[Path]:
+		"""Returns the paths of the files of the lexer and the parser generated by ANTLR for the grammar"""
+		toolDir = grammarResources.parent.bundleDir / "compiled" / self.__class__.PARSER_CLASS.NAME
+		return tuple(toolDir / (grammarResources.name + role + ".py") for role in ("Lexer", "Parser"))
+
 
 class ANTLRWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 	__slots__ = ()
@@ -1,13 +1,14 @@
 import typing
-from collections import OrderedDict
 
 from UniGrammarRuntimeCore.IParser import IParser
 
 from ...grammarClasses import PEG
 from ...IParser import IParserFactoryFromPrecompiled
-from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...IParsingBackend import InPlaceASTTransformer, IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
+from ...SchemaIndex import SchemaIndex
 from ...ToolMetadata import Product, ToolMetadata
-from ...utils import ListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin, TerminalNodeMixin
+from ...utils import CompactListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin, TerminalNodeMixin
 
 waxeye = None
 
@@ -35,7 +36,6 @@ class WaxeyeParser(IParser):
 		self.parser = parser
 
 	def __call__(self, s: str) -> "waxeye.AST":
-		print("self.parser", self.parser)
 		return self.parser.parse(s)
 
 
@@ -67,8 +67,8 @@ class WaxeyeParserFactory(IParserFactoryFromPrecompiled):
 	def processEvaledGlobals(self, globalz: dict, grammarName: str):
 		return globalz[grammarName.capitalize() + "Parser"]
 
-	def getSource(self, grammarResources: "InMemoryGrammarResources") -> "ast.Module":
-		return grammarResources.parent.backendsPythonAST[self.__class__.META.product.name, grammarResources.name + "_parser"]
+	def getSourceKey(self, grammarResources: "InMemoryGrammarResources") -> typing.Tuple[str, str]:
+		return (self.__class__.META.product.name, grammarResources.name + "_parser")
 
 	def __init__(self) -> None:
 		global waxeye
@@ -90,6 +90,55 @@ class WaxeyeParserFactory(IParserFactoryFromPrecompiled):
 		super().__init__()
 
 
+class WaxeyeSchemaIndex(SchemaIndex):
+	"""Fucking waxeye decapitalizes all the identifiers, destroying uniformity between backends. It is definitely a bug in waxeye. So the decapitalized variants of the names are added into the index."""
+
+	__slots__ = ()
+
+	@classmethod
+	def getNameVariants(cls, name: str) -> typing.Iterable[str]:
+		res = decapitalizeFirst(name)
+		if res != name and capitalizeFirst(res) == name:
+			yield res
+
+
+class WaxeyeASTTransformer(InPlaceASTTransformer):
+	"""Names the children according to `WaxeyeSchemaIndex`. The nodes are modified in place."""
+
+	__slots__ = ("parserFactory",)
+
+	def __init__(self, parserFactory: typing.Type["WaxeyeParserFactory"], schemaIndex: WaxeyeSchemaIndex) -> None:
+		super().__init__(schemaIndex)
+		self.parserFactory = parserFactory
+
+	def isLeaf(self, node: typing.Union[str, "waxeye.AST"]) -> bool:
+		return isinstance(node, str)
+
+	def getChildren(self, node: "waxeye.AST") -> typing.List[typing.Union[str, "waxeye.AST"]]:
+		return node.children
+
+	def getTransformedClass(self, node: "waxeye.AST", children: typing.List[typing.Union[str, "waxeye.AST"]]) -> type:
+		if node.type in self.iterables:
+			return self.parserFactory.ListNodes
+		if len(children) == 1 and isinstance(children[0], str):
+			return self.parserFactory.TerminalNode
+		return self.parserFactory.NodeWithAttrChildren
+
+	def transformChildren(self, node: "waxeye.AST", children: typing.List[typing.Union[str, "waxeye.AST"]], transformedClass: type) -> typing.Union[CompactListLikeDict, typing.List[typing.Union[str, "waxeye.AST"]]]:
+		if transformedClass is self.parserFactory.ListNodes:
+			return children
+
+		thisElMapping = self.capSchema.get(node.type, None)
+
+		names = []
+		for i, child in enumerate(children):
+			nameToUse = str(i)  # we cannot use just ints as keys for CompactListLikeDict because it also supports positional indexing
+			if thisElMapping and not isinstance(child, str):
+				nameToUse = thisElMapping.get(child.type, nameToUse)  # recovered name
+			names.append(nameToUse)
+		return CompactListLikeDict.fromPairs(tuple(names), children)
+
+
 class WaxeyeParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 	__slots__ = ()
 
@@ -107,62 +156,22 @@ class WaxeyeParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 
 
 class WaxeyeParsingBackend(IParsingBackend):
-	__slots__ = ("parser", "capSchema", "iterSchema")
+	__slots__ = ("parser", "capSchema", "iterSchema", "transformer")
 
 	PARSER = WaxeyeParserFactory
 	WSTR = WaxeyeParserBackendWalkStrategy
+	SCHEMA_INDEX = WaxeyeSchemaIndex
 	ITER_INTROSPECTION = False
 	CAP_INTROSPECTION = False
 
 	#EX_CLASS = waxeye.ParseError # not an Exception
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		super().__init__(grammarResources)
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		super().__init__(grammarResources, options)
 
 		self.capSchema = grammarResources.capSchema  # type: typing.Dict[str, typing.Dict[str, str]]
 		self.iterSchema = grammarResources.iterSchema  # type: typing.List[str]
-
-	def _transformWaxeyeAST(self, node: "waxeye.AST") -> None:
-		"""
-		Fucking waxeye decapitalizes all the identifiers, destroying uniformity between backends. So we have 2 lookups instead of one. It is definitely a bug in waxeye.
-		"""
-		capitalizedType = capitalizeFirst(node.type)
-
-		if node.type not in self.iterSchema and capitalizedType not in self.iterSchema:
-			newChildren = OrderedDict()
-			thisElMapping = None
-			if node.type in self.capSchema:
-				thisElMapping = self.capSchema[node.type]
-			elif capitalizedType in self.capSchema:
-				thisElMapping = self.capSchema[capitalizedType]
-
-			for i, child in enumerate(node.children):
-				nameToUse = str(i)  # we cannot use just ints as keys for ListLikeDict because it also supports positional indexing
-				if not isinstance(child, str):
-					childProdName = child.type
-					self._transformWaxeyeAST(child)
-					if thisElMapping:
-						childProdNameCapitalized = capitalizeFirst(childProdName)
-
-						if childProdName in thisElMapping:
-							nameToUse = thisElMapping[childProdName]  # recovered name
-						elif childProdNameCapitalized in thisElMapping:
-							nameToUse = thisElMapping[childProdNameCapitalized]  # recovered name
-
-					if isinstance(nameToUse, int):
-						# we have to insert something, and in this case it's better to have prod name than just number
-						nameToUse = childProdName
-				newChildren[nameToUse] = child
-			node.children = ListLikeDict(newChildren)
-
-			if len(node.children) == 1 and isinstance(node.children[0], str):
-				node.__class__ = self.__class__.PARSER.TerminalNode
-			else:
-				node.__class__ = self.__class__.PARSER.NodeWithAttrChildren
-		else:
-			for child in node.children:
-				self._transformWaxeyeAST(child)
-			node.__class__ = self.__class__.PARSER.ListNodes
+		self.transformer = WaxeyeASTTransformer(self.__class__.PARSER, grammarResources.getSchemaIndex(self.__class__.SCHEMA_INDEX))
 
 	def parse(self, s: str) -> "waxeye.AST":
 		import waxeye
@@ -174,8 +183,10 @@ class WaxeyeParsingBackend(IParsingBackend):
 		return res
 
 	def preprocessAST(self, ast):
-		self._transformWaxeyeAST(ast)
-		return ast
+		return self.transformer(ast)
+
+	def preprocessASTLazily(self, ast):
+		return self.transformer.transformLazily(ast)
 
 	def terminalNodeToStr(self, token: typing.Union[str, "waxeye.AST"]) -> str:
 		return str(token)
@@ -8,6 +8,7 @@ from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import PEG
 from ...IParser import IParserFactoryFromSource
 from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
 from ...utils import ListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin
 
@@ -85,10 +86,10 @@ class PyDSLParsingBackend(IParsingBackend):
 	PARSER = PyDSLParserFactory
 	WSTR = PyDSLParserBackendWalkStrategy
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
 		global NodeWithAttrChildren, ListNodes
 
-		super().__init__(grammarResources)
+		super().__init__(grammarResources, options)
 
 	def terminalNodeToStr(self, token) -> typing.Optional[str]:
 		raise NotImplementedError
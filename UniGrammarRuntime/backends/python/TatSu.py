@@ -8,21 +8,23 @@ from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import PEG
 from ...IParser import IParserFactoryFromPrecompiled, IParserFactoryFromPrecompiledOrSource, IParserFactoryFromSource
 from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
 
 toolGitRepo = "https://github.com/neogeny/TatSu"
 
 
 class TatSuParser(IParser):
-	__slots__ = ("parser",)
+	__slots__ = ("parser", "parseKwargs")
 	NAME = "TatSu"
 
 	def __init__(self, parser):
 		super().__init__()
 		self.parser = parser
+		self.parseKwargs = {}  # TatSu takes its settings on each call
 
 	def __call__(self, s: str):
-		return self.parser.parse(s, getattr(self.parser, "_MAIN_PRODUCTION_NAME", None))
+		return self.parser.parse(s, getattr(self.parser, "_MAIN_PRODUCTION_NAME", None), **self.parseKwargs)
 
 
 class TatSuParserFactoryFromPrecompiled(IParserFactoryFromPrecompiled):
@@ -101,6 +103,14 @@ class TatSuParserFactory(IParserFactoryFromPrecompiledOrSource):
 
 			cls.tatsu = tatsu
 
+	def applyOptions(self, parser: TatSuParser, options: typing.Optional[ParserOptions]) -> TatSuParser:
+		if options is not None:
+			if options.memoization is not None:
+				parser.parseKwargs["memoization"] = options.memoization
+			if options.leftRecursion is not None:
+				parser.parseKwargs["left_recursion"] = options.leftRecursion
+		return parser
+
 
 def _getParserClass(m: ast.Module, grammarName: str):
 	"""TaTsu has a bug: to call a python-compiled grammar one needs to explicitly provide first rule name (for ga grammar created from source he doesn't), but it is not availablei n it in machine-readable form. Fortunately it is the first func in the class."""
@@ -142,6 +152,7 @@ class TatSuParsingBackend(IParsingBackend):
 	__slots__ = ()
 	PARSER = TatSuParserFactory
 	WSTR = TatSuParserBackendWalkStrategy
+	PARSER_OPTIONS = frozenset(("memoization", "leftRecursion"))
 
 	def terminalNodeToStr(self, token) -> typing.Optional[str]:
 		return token
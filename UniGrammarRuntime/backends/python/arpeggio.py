@@ -1,17 +1,23 @@
+import sys
 import typing
 from collections import OrderedDict
 from pathlib import Path
+from threading import local
 
 from UniGrammarRuntimeCore.IParser import IParser
 
 from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import PEG
 from ...IParser import IParserFactoryFromSource
-from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...IParsingBackend import IParsingBackend, IterativeASTTransformer, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
 from ...utils import AttrDict, flattenDictsIntoIterable
 
 
+ArpeggioPEGParser = None
+
+
 class ArpeggioParser(IParser):
 	__slots__ = ("parser",)
 
@@ -47,32 +53,71 @@ class ArpeggioParserFactory(IParserFactoryFromSource):
 	)
 
 	arpeggio = None
+	metaParsers = local()  # parse grammars in arpeggio PEG DSL, building one is not free, so it is shared, but arpeggio parsers keep the state of a parse in themselves, so one per thread
 
 	@classmethod
 	def ensureInitialized(cls):
 		# pylint:disable=import-outside-toplevel,redefined-outer-name
+		global ArpeggioPEGParser
+
 		if cls.arpeggio is None:
 			import arpeggio
 			import arpeggio.peg
 
 			cls.arpeggio = arpeggio
 
+			class ArpeggioPEGParser(arpeggio.peg.ParserPEG):  # pylint:disable=redefined-outer-name
+				"""`ParserPEG` building a new meta-parser for each grammar. This one uses the shared one and, if `root_rule_name` is `None`, takes the first rule as the root one from the same parse tree."""
+
+				def _from_peg(self, language_def: str):
+					parseTree = cls.getMetaParser().parse(language_def)
+					if self.root_rule_name is None:
+						self.root_rule_name = cls.getFirstRuleName(parseTree)
+					return arpeggio.visit_parse_tree(parseTree, arpeggio.peg.PEGVisitor(self.root_rule_name, self.comment_rule_name, self.ignore_case, debug=self.debug))
+
+			ArpeggioPEGParser.__qualname__ = ArpeggioPEGParser.__name__  # compiled parsers are pickled, the class must be found by its name in the module
+
 	@classmethod
-	def getFirstRuleName(cls, grammarSrc: str) -> str:
-		parser = cls.arpeggio.ParserPython(cls.arpeggio.peg.peggrammar, cls.arpeggio.peg.comment, reduce_tree=False)
-		parsedAST = parser.parse(grammarSrc)
-		for el in parsedAST:
+	def getMetaParser(cls) -> "arpeggio.ParserPython":
+		res = getattr(cls.metaParsers, "parser", None)
+		if res is None:
+			cls.metaParsers.parser = res = cls.arpeggio.ParserPython(cls.arpeggio.peg.peggrammar, cls.arpeggio.peg.comment, reduce_tree=False)
+		return res
+
+	@classmethod
+	def getFirstRuleName(cls, parseTree: "arpeggio.NonTerminal") -> str:
+		for el in parseTree:
 			if el.rule_name == "rule":
 				if el[0].rule_name == "rule_name":
 					return el[0].flat_str()
 
 	def compileStr(self, grammarText: str, target=None, fileName: Path = None):
-		firstRuleName = self.__class__.getFirstRuleName(grammarText)
-		return self.__class__.arpeggio.peg.ParserPEG(grammarText, firstRuleName, skipws=False, debug=False)
+		"""The grammar is parsed once, with the shared meta-parser. The resulting parser model is pickled into `CompiledCache`, if it is enabled, so it is done only on a cache miss."""
+		return ArpeggioPEGParser(grammarText, None, skipws=False, debug=False)
+
+	def applyOptions(self, parser: ArpeggioParser, options: typing.Optional[ParserOptions]) -> ArpeggioParser:
+		# the model doesn't depend on it, so it is set after the parser is loaded
+		if options is not None and options.memoization is not None:
+			parser.parser.memoization = options.memoization
+		return parser
 
 	def fromInternal(self, internalRepr: str, target: str = None) -> typing.Any:
 		return self.__class__.PARSER_CLASS(self.compileStr(internalRepr, target))
 
+	def serializeCompiled(self, compiled: "arpeggio.peg.ParserPEG") -> bytes:
+		# debug output stream cannot be pickled
+		f = compiled.file
+		compiled.file = None
+		try:
+			return super().serializeCompiled(compiled)
+		finally:
+			compiled.file = f
+
+	def deserializeCompiled(self, data: bytes) -> "arpeggio.peg.ParserPEG":
+		res = super().deserializeCompiled(data)
+		res.file = sys.stdout
+		return res
+
 
 TransformedASTElT = typing.Union["arpeggio.Terminal", "TransformedASTT"]
 TransformedASTT = typing.Mapping[str, TransformedASTElT]
@@ -94,51 +139,54 @@ class ArpeggioParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 		return isinstance(lst, ListNodes)
 
 
+class ArpeggioASTTransformer(IterativeASTTransformer):
+	"""Builds a new tree of `AttrDict`s (and `list`s for collections), naming the children according to `capSchema`"""
+
+	__slots__ = ()
+
+	def isLeaf(self, node: typing.Union[str, "arpeggio.ParseTreeNode"]) -> bool:
+		return isinstance(node, (str, ArpeggioParserFactory.arpeggio.Terminal))
+
+	def transformLeaf(self, node: typing.Union[str, "arpeggio.Terminal"]) -> str:
+		if isinstance(node, str):
+			return node
+		return node.flat_str()
+
+	def getChildren(self, node: "arpeggio.NonTerminal") -> "arpeggio.NonTerminal":
+		return node
+
+	def transformNode(self, node: "arpeggio.NonTerminal", children: "arpeggio.NonTerminal", newChildren: typing.List[TransformedASTElT]) -> TransformedASTElT:
+		if node.rule_name in self.iterables:
+			return newChildren
+
+		thisElMapping = self.capSchema.get(node.rule_name, None)
+		res = AttrDict()
+		for i, (child, newChild) in enumerate(zip(children, newChildren)):
+			nameToUse = str(i)  # we cannot use just ints as keys for ListLikeDict because it also supports positional indexing
+			if thisElMapping and not isinstance(child, str):
+				nameToUse = thisElMapping.get(child.rule_name, nameToUse)  # recovered name
+			res[nameToUse] = newChild
+		return res
+
+
 class ArpeggioParsingBackend(IParsingBackend):
-	__slots__ = ("parser", "capSchema", "iterSchema")
+	__slots__ = ("parser", "capSchema", "iterSchema", "transformer")
 	ITER_INTROSPECTION = False
 	CAP_INTROSPECTION = False
 	PARSER = ArpeggioParserFactory
 	WSTR = ArpeggioParserBackendWalkStrategy
+	PARSER_OPTIONS = frozenset(("memoization",))
 
-	@classmethod
-	def _transformArpeggioAST(cls, node, capSchema: typing.Dict[str, typing.Dict[str, str]], iterSchema: typing.List[str]) -> TransformedASTElT:
-		if node.rule_name not in iterSchema:
-			newChildren = AttrDict()
-			thisElMapping = None
-			if node.rule_name in capSchema:
-				thisElMapping = capSchema[node.rule_name]
-
-			if not isinstance(node, cls.PARSER.arpeggio.Terminal):
-				for i, child in enumerate(node):
-					nameToUse = str(i)  # we cannot use just ints as keys for ListLikeDict because it also supports positional indexing
-					if not isinstance(child, str):
-						childProdName = child.rule_name
-						newChild = cls._transformArpeggioAST(child, capSchema, iterSchema)
-						if thisElMapping:
-							if childProdName in thisElMapping:
-								nameToUse = thisElMapping[childProdName]  # recovered name
-
-						if isinstance(nameToUse, int):
-							# we have to insert something, and in this case it's better to have prod name than just number
-							nameToUse = childProdName
-					else:
-						newChild = child
-					newChildren[nameToUse] = newChild
-				return newChildren
-			return node.flat_str()
-		else:
-			return [cls._transformArpeggioAST(child, capSchema, iterSchema) for child in node]
-
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		super().__init__(grammarResources)
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		super().__init__(grammarResources, options)
 		self.capSchema = grammarResources.capSchema
 		self.iterSchema = grammarResources.iterSchema
 
 		self.__class__.PARSER.ensureInitialized()
+		self.transformer = ArpeggioASTTransformer(grammarResources.getSchemaIndex(self.__class__.SCHEMA_INDEX))
 
 	def preprocessAST(self, ast):
-		return self.__class__._transformArpeggioAST(ast, self.capSchema, self.iterSchema)
+		return self.transformer(ast)
 
 	def terminalNodeToStr(self, token) -> typing.Optional[str]:
 		return "".join(flattenDictsIntoIterable(node))
@@ -1,19 +1,19 @@
 import typing
-from collections import OrderedDict
+from functools import partial
+from io import BytesIO
 from pathlib import Path
 
 from UniGrammarRuntimeCore.IParser import IParser
 
 from ...DSLMetadata import DSLMetadata
-from ...grammarClasses import PEG
-from ...IParser import IParserFactoryFromSource
-from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...grammarClasses import LALR
+from ...IParser import IParserFactoryFromPrecompiled, IParserFactoryFromPrecompiledOrSource, IParserFactoryFromSource
+from ...IParsingBackend import IParsingBackend, IterativeASTTransformer, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
-from ...utils import ListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin
+from ...utils import CompactListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin
 
 lark = None
-NodeWithAttrChildren = None
-ListNodes = None
 
 
 toolGitRepo = "https://github.com/lark-parser/lark"
@@ -35,20 +35,44 @@ class LarkParser(IParser):
 		return self.parser.parse(s)
 
 
-class LarkParserFactory(IParserFactoryFromSource):
-	__slots__ = ()
+larkMeta = ToolMetadata(
+	Product(
+		name="lark",
+		website=toolGitRepo,
+	),
+	runtimeLib={
+		"python": srcURI,
+	},
+	grammarClasses=(LALR,),
+	buildsTree=True,
+)
+
+
+class LarkParserFactoryFromPrecompiled(IParserFactoryFromPrecompiled):
+	"""Loads a standalone parser generated by `python -m lark.tools.standalone`. Its LALR tables are serialized inline, so they are not built on load, and lark itself is not needed."""
+
+	__slots__ = ("transformer",)
 	PARSER_CLASS = LarkParser
-	META = ToolMetadata(
-		Product(
-			name="lark",
-			website=toolGitRepo,
-		),
-		runtimeLib={
-			"python": srcURI,
-		},
-		grammarClasses=(PEG,),
-		buildsTree=True,
+	META = larkMeta
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.transformer = None
+
+	def processEvaledGlobals(self, globalz: dict, grammarName: str):
+		return partial(globalz["Lark_StandAlone"], transformer=self.transformer)
+
+
+class LarkParserFactoryFromSource(IParserFactoryFromSource):
+	"""`transformer` is passed to lark and is applied inline: the callbacks are called by the LALR parser on each reduction, so a tree of `lark.Tree`s is never built"""
+
+	__slots__ = ("transformer",)
+	PARSER_CLASS = LarkParser
+	FORMAT = DSLMetadata(
+		officialLibraryRepo=masterBranchURI + "/examples",
+		grammarExtensions=("lark",)
 	)
+	META = larkMeta
 
 	def __init__(self) -> None:
 		global lark
@@ -57,45 +81,180 @@ class LarkParserFactory(IParserFactoryFromSource):
 			import lark  # pylint:disable=import-outside-toplevel,redefined-outer-name
 
 		super().__init__()
+		self.transformer = None
+
+	def compileStr(self, grammarText: str, target=None, fileName: Path = None) -> "lark.Lark":
+		# contextual lexer is the fastest one and resolves the most of terminals collisions; absent optionals are just absent, as in the other backends and in standalone parsers, instead of being `None` placeholders
+		return lark.Lark(grammarText, parser="lalr", lexer="contextual", maybe_placeholders=False, transformer=self.transformer)
 
-	def compileStr(self, grammarText: str, target=None, fileName: Path = None):
-		return lark.Lark(grammarText, parser="lalr", lexer="auto")
+	def serializeCompiled(self, compiled: "lark.Lark") -> bytes:
+		with BytesIO() as f:
+			compiled.save(f, exclude_options=("transformer",))
+			return f.getvalue()
+
+	def deserializeCompiled(self, data: bytes) -> "lark.Lark":
+		res = lark.Lark.__new__(lark.Lark)
+		with BytesIO(data) as f:
+			# the public `Lark.load` doesn't allow to pass a transformer
+			return res._load(f, transformer=self.transformer)  # pylint:disable=protected-access
 
 	def fromInternal(self, internalRepr: str, target: str = None) -> typing.Any:
 		return self.__class__.PARSER_CLASS(self.compileStr(internalRepr, target))
 
 
+class LarkParserFactory(IParserFactoryFromPrecompiledOrSource):
+	"""Uses a standalone parser from `compiled/lark/<grammar>.py` if it is present, otherwise compiles `compiled/lark/<grammar>.lark`. `transformer` is passed to both."""
+
+	__slots__ = ("transformer",)
+	PRECOMPILED = LarkParserFactoryFromPrecompiled
+	SOURCE = LarkParserFactoryFromSource
+	PARSER_CLASS = LarkParser
+	META = larkMeta
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.transformer = None
+
+	@property
+	def precompiled(self) -> LarkParserFactoryFromPrecompiled:
+		res = super().precompiled
+		res.transformer = self.transformer
+		return res
+
+	@property
+	def source(self) -> LarkParserFactoryFromSource:
+		res = super().source
+		res.transformer = self.transformer
+		return res
+
+
+class NodeWithAttrChildren(NodeWithAttrChildrenMixin):
+	__slots__ = ("data", "children")
+
+	def __init__(self, data: str, children: CompactListLikeDict) -> None:
+		self.data = data
+		self.children = children
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + repr(self.data) + ", " + repr(self.children) + ")"
+
+
+class ListNodes(ListNodesMixin):
+	__slots__ = ("data", "children")
+
+	def __init__(self, data: str, children: typing.List[typing.Any]) -> None:
+		self.data = data
+		self.children = children
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + repr(self.data) + ", " + repr(self.children) + ")"
+
+
+class LarkASTTransformer(IterativeASTTransformer):
+	"""Builds a tree of `NodeWithAttrChildren`s (and `ListNodes`s for collections) out of lark `Tree`s. `Token`s are `str`s, so they are kept as they are.
+	Children are named by the names of their productions (`Tree.data`) or terminals (`Token.type`), recovered according to `capSchema`."""
+
+	__slots__ = ()
+
+	def isLeaf(self, node: typing.Union["lark.Tree", "lark.Token"]) -> bool:
+		return isinstance(node, str)  # standalone parsers have own `Token` class
+
+	def getChildren(self, node: "lark.Tree") -> typing.List[typing.Union["lark.Tree", "lark.Token"]]:
+		return node.children
+
+	def transformNode(self, node: "lark.Tree", children: typing.List[typing.Union["lark.Tree", "lark.Token"]], newChildren: typing.List[typing.Any]) -> typing.Union[NodeWithAttrChildren, ListNodes]:
+		return self.makeNode(node.data, newChildren)
+
+	def makeNode(self, data: str, children: typing.List[typing.Any]) -> typing.Union[NodeWithAttrChildren, ListNodes]:
+		"""Creates a node from already transformed `children`. Used both in the tree mode and in the inline one.
+		Lark inlines repetitions into the parent, so the children of the productions from `iterSchema` are always grouped into a `ListNodes` named by them, even if there is a single one, in order the shape of the tree not to depend on the input. Other children with the same name are grouped too, in order none of them to be lost."""
+		if data in self.iterables:
+			return ListNodes(data, children)
+
+		rawNames = tuple(child.type if isinstance(child, str) else child.data for child in children)
+		names = rawNames
+		thisElMapping = self.capSchema.get(data, None)
+		if thisElMapping:
+			names = tuple(thisElMapping.get(name, name) for name in names)  # recovered name
+
+		if not self.iterables.isdisjoint(rawNames) or len(frozenset(names)) != len(names):
+			grouped = {}
+			for rawName, name, child in zip(rawNames, names, children):
+				grouped.setdefault(name, (rawName in self.iterables, []))[1].append(child)
+			names = tuple(grouped)
+			children = [ListNodes(name, group) if len(group) > 1 or (isCollection and not isinstance(group[0], ListNodes)) else group[0] for name, (isCollection, group) in grouped.items()]
+
+		return NodeWithAttrChildren(data, CompactListLikeDict.fromPairs(names, children))
+
+
+class InlinedRuleNode:
+	"""A result of a rule which name starts with `_` (including the ones lark generates for `+` and `*`). Lark inlines its `children` into the parent node itself, it only needs the attribute."""
+
+	__slots__ = ("data", "children")
+
+	def __init__(self, data: str, children: typing.List[typing.Any]) -> None:
+		self.data = data
+		self.children = children
+
+
+class LarkInlineTransformer:
+	"""Lark looks up a callback for each rule as an attribute of the transformer named as the rule, so `LarkASTTransformer` is hidden behind this object having no attributes with lowercase names, in order all the rules to go to `__default__`"""
+
+	__slots__ = ("makeNode",)
+
+	def __init__(self, makeNode: typing.Callable[[str, typing.List[typing.Any]], typing.Any]) -> None:
+		self.makeNode = makeNode
+
+	def __default__(self, data: str, children: typing.List[typing.Any], meta: typing.Any) -> typing.Any:
+		if data[0] == "_":
+			return InlinedRuleNode(data, children)
+		return self.makeNode(data, children)
+
+
 class LarkParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 	__slots__ = ()
 
 	def iterateChildren(self, node):
-		raise NotImplementedError
+		return node.children
 
 	def isTerminal(self, node):
-		raise NotImplementedError
+		return isinstance(node, str)
 
 	def iterateCollection(self, lst) -> typing.Any:
-		raise NotImplementedError
+		return lst.children
 
 	def isCollection(self, lst: typing.Any) -> bool:
-		raise NotImplementedError
+		return isinstance(lst, ListNodes)
 
 
 class LarkParsingBackend(IParsingBackend):
-	__slots__ = ("parser", "capSchema")
+	"""In the inline mode (the default one) the nodes are created by lark itself during the parse, so `preprocessAST` has nothing to do. In the tree mode lark builds `Tree`s, which are transformed by `preprocessAST`."""
+
+	__slots__ = ("parser", "capSchema", "transformer")
 	ITER_INTROSPECTION = True
 	CAP_INTROSPECTION = True
 	PARSER = LarkParserFactory
 	WSTR = LarkParserBackendWalkStrategy
+	# `EX_CLASS` is left generic, since standalone parsers have own exceptions classes, unrelated to the ones of lark
+	INLINE_TRANSFORMER = True
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		global NodeWithAttrChildren, ListNodes
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		self.transformer = LarkASTTransformer(grammarResources.getSchemaIndex(self.__class__.SCHEMA_INDEX))
+		super().__init__(grammarResources, options)
+		self.capSchema = grammarResources.capSchema
 
-		super().__init__(grammarResources)
+	def createParser(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> LarkParser:
+		factory = self.__class__.PARSER()
+		if self.__class__.INLINE_TRANSFORMER:
+			factory.transformer = LarkInlineTransformer(self.transformer.makeNode)
+		return factory.fromBundle(grammarResources, options)
 
-	def terminalNodeToStr(self, token: "lark.nodes.RegexNode") -> typing.Optional[str]:
-		raise NotImplementedError
+	def preprocessAST(self, ast):
+		if self.__class__.INLINE_TRANSFORMER:
+			return ast
+		return self.transformer(ast)
 
-	def getSubTreeText(self, node: "lark.nodes.Node") -> str:
-		"""Merges a tree of text tokens into a single string"""
-		raise NotImplementedError
+	def terminalNodeToStr(self, token: typing.Optional["lark.Token"]) -> typing.Optional[str]:
+		if token is not None:
+			return str(token)
+		return None
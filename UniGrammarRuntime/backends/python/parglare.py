@@ -1,12 +1,15 @@
 import typing
 from pathlib import Path
+from warnings import warn
 
 from UniGrammarRuntimeCore.IParser import IParser
 
+from ...CompiledCache import hashSource
 from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import GLR, LR
 from ...IParser import IParserFactoryFromSource
 from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
 
 thisDir = Path(__file__).parent
@@ -17,13 +20,18 @@ toolGitRepo = "https://github.com/igordejanovic/parglare"
 class ParglareParser(IParser):
 	NAME = "parglare"
 
-	__slots__ = ("parser",)
+	__slots__ = ("parser", "isGLR")
 
-	def __init__(self, parser: "parglare.parser.Parser") -> None:
+	def __init__(self, parser: typing.Union["parglare.parser.Parser", "parglare.glr.GLRParser"]) -> None:
 		super().__init__()
 		self.parser = parser
+		self.isGLR = isinstance(parser, ParglareParserFactory.parglare.GLRParser)
 
 	def __call__(self, s: str):
+		if self.isGLR:
+			# GLR parser returns a forest of trees, actions are called on the first one to get the same kind of result as the LR parser returns
+			forest = self.parser.parse(s)
+			return self.parser.call_actions(forest.get_first_tree())
 		return self.parser.parse(s)
 
 
@@ -52,17 +60,77 @@ class ParglareParserFactory(IParserFactoryFromSource):
 	def ensureInitialized(cls):
 		if cls.parglare is None:
 			import parglare  # pylint:disable=import-outside-toplevel,redefined-outer-name
+			import parglare.tables  # pylint:disable=import-outside-toplevel
 
 			cls.parglare = parglare
 
 	def __init__(self) -> None:
 		super().__init__()
 
-	def compileStr(self, grammarText: str, target: str = None, fileName: Path = None) -> "parglare.parser.Parser":
-		return self.__class__.parglare.Parser(self.__class__.parglare.Grammar.from_string(grammarText), ws="", debug=False)
+	TABLE_EXT = "pgt"
+	TABLE_BUILD_OPTIONS = {"prefer_shifts": True, "prefer_shifts_over_empty": True}  # conflicts are resolved the same way `parglare.Parser` does by default
+
+	def getTableMetadata(self, grammar: "parglare.grammar.Grammar", grammarText: str) -> typing.Dict[str, typing.Any]:
+		"""parglare fingerprints only the files a grammar is loaded from, but the grammars from bundles are loaded from strings, so their text is hashed instead. Unlike the paths it is the same on every machine, so the tables can be shipped within bundles."""
+		tables = self.__class__.parglare.tables
+		res = tables.table_cache_metadata(grammar, dict(itemset_type=tables.LR_1, start_production=1, **self.__class__.TABLE_BUILD_OPTIONS))
+		res["grammar_fingerprint"] = hashSource(grammarText)
+		return res
+
+	def createTable(self, grammar: "parglare.grammar.Grammar", grammarText: typing.Optional[str] = None, tableFile: typing.Optional[Path] = None, shippedTableFile: typing.Optional[Path] = None) -> "parglare.tables.LRTable":
+		"""Computing LR tables is the most expensive part, so they are persisted into `tableFile` (if any) and reused while `grammarText` is unchanged. `shippedTableFile` is only read, it is tried first."""
+		tables = self.__class__.parglare.tables
+		if tableFile is not None or shippedTableFile is not None:
+			metadata = self.getTableMetadata(grammar, grammarText)
+			for f in (shippedTableFile, tableFile):
+				if f is not None:
+					try:
+						return tables.load_table(f, grammar, metadata)
+					except tables.TableCacheError:
+						pass  # missing or outdated
+
+		res = tables.create_table(grammar, lexical_disambiguation=True, **self.__class__.TABLE_BUILD_OPTIONS)
+
+		if tableFile is not None:
+			try:
+				tableFile.parent.mkdir(parents=True, exist_ok=True)
+				tables.save_table(tableFile, res, metadata)
+			except OSError as ex:
+				warn("Cannot store parglare LR table into " + str(tableFile) + ": " + repr(ex))
+
+		return res
+
+	def createParser(self, grammar: "parglare.grammar.Grammar", grammarText: typing.Optional[str] = None, tableFile: typing.Optional[Path] = None, shippedTableFile: typing.Optional[Path] = None) -> typing.Union["parglare.parser.Parser", "parglare.glr.GLRParser"]:
+		"""GLR parser is used only for the grammars having conflicts not resolved by the default preferences, LR parser rejects them"""
+		parglare = self.__class__.parglare  # pylint:disable=redefined-outer-name
+		table = self.createTable(grammar, grammarText, tableFile, shippedTableFile)
+
+		if table.sr_conflicts or table.rr_conflicts:
+			parserClass = parglare.GLRParser
+		else:
+			parserClass = parglare.Parser
+
+		return parserClass(grammar, table=table, ws="", debug=False)
+
+	def compileStr(self, grammarText: str, target: str = None, fileName: Path = None) -> typing.Union["parglare.parser.Parser", "parglare.glr.GLRParser"]:
+		return self.createParser(self.__class__.parglare.Grammar.from_string(grammarText))
 
 	def compileFile(self, grammarFile: Path, target: str = None):
-		return self.__class__.parglare.Parser(self.__class__.parglare.Grammar.from_file(grammarFile), ws="", debug=False)
+		return self.createParser(self.__class__.parglare.Grammar.from_file(grammarFile))
+
+	def fromBundle(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> ParglareParser:
+		"""The LR table shipped within the bundle is used if it matches the grammar. Otherwise, with `compiledCache` enabled, the table is persisted in it. The bundle itself is never written."""
+		tableFileName = grammarResources.name + "." + self.__class__.TABLE_EXT
+		shippedTableFile = grammarResources.parent.bundleDir / "compiled" / self.__class__.META.product.name / tableFileName
+		cache = grammarResources.parent.compiledCache
+		if cache is None:
+			tableFile = None
+		else:
+			tableFile = cache.dir / self.__class__.META.product.name / tableFileName
+
+		grammarText = self.getSource(grammarResources)
+		grammar = self.__class__.parglare.Grammar.from_string(grammarText)
+		return self.applyOptions(self.__class__.PARSER_CLASS(self.createParser(grammar, grammarText, tableFile, shippedTableFile)), options)
 
 	def fromInternal(self, internalRepr: str, target: str = None) -> typing.Any:
 		return self.__class__.PARSER_CLASS(self.compileStr(internalRepr, target))
@@ -92,8 +160,8 @@ class ParglareParsingBackend(IParsingBackend):
 	PARSER = ParglareParserFactory
 	WSTR = ParglareParserBackendWalkStrategy
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		super().__init__(grammarResources)
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		super().__init__(grammarResources, options)
 		if self.__class__.EX_CLASS is None:
 			self.__class__.EX_CLASS = self.__class__.PARSER.parglare.exceptions.ParseError
 
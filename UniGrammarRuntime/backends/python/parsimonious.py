@@ -1,5 +1,6 @@
 import typing
-from collections import OrderedDict
+from collections import defaultdict
+from functools import partial
 from pathlib import Path
 
 from UniGrammarRuntimeCore.IParser import IParser
@@ -7,27 +8,43 @@ from UniGrammarRuntimeCore.IParser import IParser
 from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import PEG
 from ...IParser import IParserFactoryFromSource
-from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...IParsingBackend import InPlaceASTTransformer, IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
-from ...utils import ListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin
+from ...utils import CompactListLikeDict, ListNodesMixin, NodeWithAttrChildrenMixin
 
 parsimonious = None
 NodeWithAttrChildren = None
 ListNodes = None
+NoMemoPosCache = None
+BoundedPosCache = None
 
 
 toolGitRepo = "https://github.com/erikrose/parsimonious"
 
 
 class ParsimoniousParser(IParser):
-	__slots__ = ("parser",)
+	__slots__ = ("parser", "newCache")
 
 	def __init__(self, parser: "parsimonious.grammar.Grammar") -> None:
 		super().__init__()
 		self.parser = parser
+		self.newCache = None  # creates the packrat cache for a parse, `None` means the one of parsimonious
 
 	def __call__(self, s: str) -> "parsimonious.nodes.Node":
-		return self.parser.parse(s)
+		if self.newCache is None:
+			return self.parser.parse(s)
+
+		# the same as `Expression.parse`, but with our cache
+		parsimonious = ParsimoniousParserFactory.parsimonious  # pylint:disable=redefined-outer-name
+		expr = self.parser.default_rule
+		error = parsimonious.exceptions.ParseError(s)
+		node = expr.match_core(s, 0, self.newCache(), error)
+		if node is None:
+			raise error
+		if node.end < len(s):
+			raise parsimonious.exceptions.IncompleteParseError(s, node.end, expr)
+		return node
 
 
 class ParsimoniousParserFactory(IParserFactoryFromSource):
@@ -55,49 +72,91 @@ class ParsimoniousParserFactory(IParserFactoryFromSource):
 
 	@classmethod
 	def ensureInitialized(cls):
+		global NoMemoPosCache, BoundedPosCache
+
 		if cls.parsimonious is None:
 			import parsimonious  # pylint:disable=import-outside-toplevel,redefined-outer-name
 
 			cls.parsimonious = parsimonious
 
+			IN_PROGRESS = parsimonious.expressions.IN_PROGRESS  # pylint:disable=invalid-name
+
+			# parsimonious packrat cache is `{id(expr): {pos: node}}`, these replace the inner dicts
+
+			class NoMemoPosCache(dict):  # pylint:disable=redefined-outer-name
+				"""Keeps only the marks of the expressions being matched, used to detect left recursion, but not the results"""
+
+				__slots__ = ()
+
+				def __setitem__(self, k: int, v: typing.Any) -> None:
+					if v is IN_PROGRESS:
+						super().__setitem__(k, v)
+					else:
+						self.pop(k, None)
+
+			class BoundedPosCache(dict):  # pylint:disable=redefined-outer-name,unused-variable
+				"""Keeps only `limit` latest results. PEG parsers mostly move forward, so backtracking usually needs the results for the recent positions. The marks of the expressions being matched are never evicted, they are needed to detect left recursion."""
+
+				__slots__ = ("limit",)
+
+				def __init__(self, limit: int) -> None:
+					super().__init__()
+					self.limit = limit
+
+				def __setitem__(self, k: int, v: typing.Any) -> None:
+					super().__setitem__(k, v)
+					if len(self) > self.limit:
+						for pos, res in self.items():
+							if res is not IN_PROGRESS:
+								del self[pos]
+								break
+
 	def compileStr(self, grammarText: str, target=None, fileName: Path = None) -> "parsimonious.grammar.Grammar":
 		return self.__class__.parsimonious.Grammar(grammarText)
 
 	def fromInternal(self, internalRepr: str, target: str = None) -> typing.Any:
 		return self.__class__.PARSER_CLASS(self.compileStr(internalRepr, target))
 
+	def applyOptions(self, parser: ParsimoniousParser, options: typing.Optional[ParserOptions]) -> ParsimoniousParser:
+		if options is not None:
+			if options.memoization is False:
+				parser.newCache = partial(defaultdict, NoMemoPosCache)
+			elif options.cacheSizeLimit is not None:
+				parser.newCache = partial(defaultdict, partial(BoundedPosCache, options.cacheSizeLimit))
+		return parser
+
 
-def _transformParsimoniousAST(node: typing.Union["parsimonious.nodes.Node", "parsimonious.nodes.RegexNode"], capSchema: typing.Dict[str, typing.Dict[str, str]]) -> None:
+class ParsimoniousASTTransformer(InPlaceASTTransformer):
 	"""Walks parsimonious AST to make it more friendly for our processing:
-		1. Replaces lists of children with `ListLikeDict`s, using `expr_name`s as keys
+		1. Replaces lists of children with `CompactListLikeDict`s, using `expr_name`s as keys
 		2. Adds `__getattr__` to the nodes looking up attrs in the dicts of children
 
-		All of this is needed because our postprocessing is attr-based.
+		All of this is needed because our postprocessing is attr-based. The nodes are modified in place.
 	"""
 
-	if not isinstance(node, ParsimoniousParserFactory.parsimonious.nodes.RegexNode):
-		if not isinstance(node.expr, ParsimoniousParserFactory.parsimonious.expressions.Quantifier): # or (node.expr.min==0 and node.expr.max==1): # in pats it handled only ZeroOrMore and OneOrMore, but when P. has abstracted a bit, they have become a Quantifier, and so become Optional, was it a mistake not to handle it here too?
-			newChildren = OrderedDict()
-			for child in node.children:
-				childProdName = child.expr_name
-				_transformParsimoniousAST(child, capSchema)
-				nameToUse = None
-				if node.expr_name in capSchema:
-					thisElMapping = capSchema[node.expr_name]
-
-					if childProdName in thisElMapping:
-						nameToUse = thisElMapping[childProdName]  # recovered name
-
-				if nameToUse is None:
-					# we have to insert something
-					nameToUse = childProdName
-				newChildren[nameToUse] = child
-			node.children = ListLikeDict(newChildren)
-			node.__class__ = NodeWithAttrChildren
+	__slots__ = ()
+
+	def isLeaf(self, node: "parsimonious.nodes.Node") -> bool:
+		return isinstance(node, ParsimoniousParserFactory.parsimonious.nodes.RegexNode)
+
+	def getChildren(self, node: "parsimonious.nodes.Node") -> typing.List["parsimonious.nodes.Node"]:
+		return node.children
+
+	def getTransformedClass(self, node: "parsimonious.nodes.Node", children: typing.List["parsimonious.nodes.Node"]) -> type:
+		if isinstance(node.expr, ParsimoniousParserFactory.parsimonious.expressions.Quantifier):  # or (node.expr.min==0 and node.expr.max==1): # in pats it handled only ZeroOrMore and OneOrMore, but when P. has abstracted a bit, they have become a Quantifier, and so become Optional, was it a mistake not to handle it here too?
+			return ListNodes
+		return NodeWithAttrChildren
+
+	def transformChildren(self, node: "parsimonious.nodes.Node", children: typing.List["parsimonious.nodes.Node"], transformedClass: type) -> typing.Union[CompactListLikeDict, typing.List["parsimonious.nodes.Node"]]:
+		if transformedClass is ListNodes:
+			return children
+
+		thisElMapping = self.capSchema.get(node.expr_name, None)
+		if thisElMapping:
+			names = tuple(thisElMapping.get(child.expr_name, child.expr_name) for child in children)  # recovered name, if there is no, we have to insert something
 		else:
-			for child in node.children:
-				_transformParsimoniousAST(child, capSchema)
-			node.__class__ = ListNodes
+			names = tuple(child.expr_name for child in children)
+		return CompactListLikeDict.fromPairs(names, children)
 
 
 class ParsimoniousParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
@@ -117,17 +176,19 @@ class ParsimoniousParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 
 
 class ParsimoniousParsingBackend(IParsingBackend):
-	__slots__ = ("parser", "capSchema")
+	__slots__ = ("parser", "capSchema", "transformer")
 	ITER_INTROSPECTION = True
 	CAP_INTROSPECTION = False
 	PARSER = ParsimoniousParserFactory
 	WSTR = ParsimoniousParserBackendWalkStrategy
+	PARSER_OPTIONS = frozenset(("memoization", "cacheSizeLimit"))
 
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
 		global NodeWithAttrChildren, ListNodes
 
-		super().__init__(grammarResources)
+		super().__init__(grammarResources, options)
 		self.capSchema = grammarResources.capSchema
+		self.transformer = ParsimoniousASTTransformer(grammarResources.getSchemaIndex(self.__class__.SCHEMA_INDEX))
 
 		if NodeWithAttrChildren is None:
 
@@ -138,8 +199,10 @@ class ParsimoniousParsingBackend(IParsingBackend):
 				__slots__ = ()
 
 	def preprocessAST(self, ast):
-		_transformParsimoniousAST(ast, self.capSchema)
-		return ast
+		return self.transformer(ast)
+
+	def preprocessASTLazily(self, ast):
+		return self.transformer.transformLazily(ast)
 
 	def terminalNodeToStr(self, token: "parsimonious.nodes.RegexNode") -> typing.Optional[str]:
 		return token.text
@@ -8,11 +8,16 @@ from ...DSLMetadata import DSLMetadata
 from ...grammarClasses import RegExp
 from ...IParser import IParserFactoryFromSource
 from ...IParsingBackend import IParsingBackend, ToolSpecificGrammarASTWalkStrategy
+from ...ParserOptions import ParserOptions
 from ...ToolMetadata import Product, ToolMetadata
+from ...utils import AttrDict, decodeBuffer
 
-thisDir = Path(__file__).parent
+try:
+	from re import _parser as sre_parse
+except ImportError:
+	import sre_parse  # pylint:disable=deprecated-module
 
-parglare = None
+thisDir = Path(__file__).parent
 
 
 toolGitRepo = "https://github.com/python/cpython"
@@ -21,14 +26,38 @@ toolGitRepo = "https://github.com/python/cpython"
 class PythonRegExpParser(IParser):
 	NAME = "python_re"
 
-	__slots__ = ("parser",)
+	__slots__ = ("parser", "_bytesParser")
 
 	def __init__(self, parser: "_sre.SRE_Pattern") -> None:
 		super().__init__()
 		self.parser = parser
-
-	def __call__(self, s: str):
-		return self.parser.exec(s)
+		self._bytesParser = None
+
+	@property
+	def bytesParser(self) -> typing.Optional["_sre.SRE_Pattern"]:
+		"""`re` can match `bytes`-like objects (including `mmap`) directly, but only with a `bytes` pattern. A non-ASCII char of a pattern would become several bytes matched one by one, so for such patterns it is `None` and buffers have to be decoded."""
+		res = self._bytesParser
+		if res is None:
+			if self.parser.pattern.isascii():
+				res = re.compile(self.parser.pattern.encode("ascii"), self.parser.flags & ~re.UNICODE)
+			else:
+				res = False
+			self._bytesParser = res
+		return res or None
+
+	def __call__(self, s: typing.Union[str, bytes, memoryview, "mmap.mmap"]) -> "re.Match":
+		if isinstance(s, str):
+			res = self.parser.fullmatch(s)
+		else:
+			bytesParser = self.bytesParser
+			if bytesParser is not None:
+				res = bytesParser.fullmatch(s)
+			else:
+				res = self.parser.fullmatch(decodeBuffer(s))
+
+		if res is None:
+			raise ValueError("The input doesn't match the regular expression")
+		return res
 
 
 class PythonRegExpParserFactory(IParserFactoryFromSource):
@@ -46,8 +75,8 @@ class PythonRegExpParserFactory(IParserFactoryFromSource):
 		runtimeLib={
 			"python": toolGitRepo,
 		},
-		grammarClasses=(RegExp),
-		buildsTree=True,
+		grammarClasses=(RegExp,),
+		buildsTree=False,
 	)
 
 	def compileStr(self, grammarText: str, target: str = None, fileName: Path = None) -> "_sre.SRE_Pattern":
@@ -57,33 +86,101 @@ class PythonRegExpParserFactory(IParserFactoryFromSource):
 		return self.__class__.PARSER_CLASS(self.compileStr(internalRepr, target))
 
 
+class MatchNode(AttrDict):
+	"""A named group of a match containing other named groups. Keeps the text matched by the whole group, since it is not always a concatenation of the children."""
+
+	__slots__ = ("text",)
+
+	def __init__(self, text: typing.Union[str, bytes], children: typing.Iterable[typing.Tuple[str, typing.Any]]) -> None:
+		super().__init__(children)
+		self.text = text
+
+
+GroupPlanT = typing.Tuple[str, int, typing.Tuple["GroupPlanT", ...]]
+
+
+def _getGroupsTree(pattern: "re.Pattern") -> typing.Tuple[GroupPlanT, ...]:
+	"""Returns the tree of nesting of named groups of a regexp. Unnamed groups are transparent: their named groups are attributed to the closest named ancestor."""
+	indexToName = {v: k for k, v in pattern.groupindex.items()}
+
+	def walkSubPattern(subPattern) -> typing.Iterator[GroupPlanT]:
+		for op, av in subPattern:
+			if op is sre_parse.SUBPATTERN and av[0] is not None and av[0] in indexToName:
+				yield (indexToName[av[0]], av[0], tuple(walkArgs(av)))
+			else:
+				yield from walkArgs(av)
+
+	def walkArgs(av) -> typing.Iterator[GroupPlanT]:
+		if isinstance(av, sre_parse.SubPattern):
+			yield from walkSubPattern(av)
+		elif isinstance(av, (tuple, list)):
+			for el in av:
+				yield from walkArgs(el)
+
+	return tuple(walkSubPattern(sre_parse.parse(pattern.pattern, pattern.flags)))
+
+
+def _resolveCapNames(groupsTree: typing.Tuple[GroupPlanT, ...], thisElMapping: typing.Optional[typing.Dict[str, str]], capSchema: typing.Dict[str, typing.Dict[str, str]]) -> typing.Tuple[GroupPlanT, ...]:
+	"""Replaces groups names (which are productions names) with the names of captures from `capSchema`, once per grammar, not per match"""
+	res = []
+	for name, idx, children in groupsTree:
+		capName = name
+		if thisElMapping and name in thisElMapping:
+			capName = thisElMapping[name]  # recovered name
+		res.append((capName, idx, _resolveCapNames(children, capSchema.get(name, None), capSchema)))
+	return tuple(res)
+
+
 class PythonRegExpParserBackendWalkStrategy(ToolSpecificGrammarASTWalkStrategy):
 	__slots__ = ()
 
-	def iterateChildren(self, node):
-		raise NotImplementedError
+	def iterateChildren(self, node: MatchNode):
+		return node.values()
 
-	def isTerminal(self, node):
-		raise NotImplementedError
+	def isTerminal(self, node: typing.Any) -> bool:
+		return isinstance(node, (str, bytes))
 
 	def iterateCollection(self, lst) -> typing.Any:
-		raise NotImplementedError
+		return lst
 
 	def isCollection(self, lst: typing.Any) -> bool:
-		raise NotImplementedError
+		return isinstance(lst, list)  # regexps capture only the last repetition, so there are no collections
 
 
-# copied from parglare, not yet implemented
 class PythonRegExpParsingBackend(IParsingBackend):
-	__slots__ = ()
-	EX_CLASS = None
+	"""A fast path for the grammars of `RegExp` class. Named groups are the productions. The nodes are built directly from the match, without building any intermediate tree: groups containing other named groups become `MatchNode`s, other ones become the matched text."""
+
+	__slots__ = ("groupsTree",)
+	EX_CLASS = ValueError
+	ITER_INTROSPECTION = False
+	CAP_INTROSPECTION = True
 	PARSER = PythonRegExpParserFactory
 	WSTR = PythonRegExpParserBackendWalkStrategy
-
-	def __init__(self, grammarResources: "InMemoryGrammarResources") -> None:
-		super().__init__(grammarResources)
-		raise NotImplementedError
-
-	def terminalNodeToStr(self, token: typing.Optional[typing.Any]) -> typing.Optional[typing.Any]:
-		raise NotImplementedError
-		#return token
+	ACCEPTS_BUFFERS = True
+
+	def __init__(self, grammarResources: "InMemoryGrammarResources", options: typing.Optional[ParserOptions] = None) -> None:
+		super().__init__(grammarResources, options)
+		self.groupsTree = _resolveCapNames(_getGroupsTree(self.parser.parser), None, grammarResources.getSchemaIndex(self.__class__.SCHEMA_INDEX).capSchema)
+
+	@classmethod
+	def _buildNodes(cls, m: "re.Match", groupsTree: typing.Tuple[GroupPlanT, ...]) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+		group = m.group
+		for capName, idx, children in groupsTree:
+			text = group(idx)
+			if text is not None and children:
+				text = MatchNode(text, cls._buildNodes(m, children))
+			yield capName, text
+
+	def preprocessAST(self, ast: "re.Match") -> MatchNode:
+		return MatchNode(ast.group(0), self.__class__._buildNodes(ast, self.groupsTree))
+
+	def terminalNodeToStr(self, token: typing.Optional[typing.Union[str, bytes]]) -> typing.Optional[str]:
+		if isinstance(token, bytes):
+			return token.decode(self.__class__.ENCODING)
+		return token
+
+	def getSubTreeText(self, node: typing.Union[MatchNode, str, bytes]) -> str:
+		"""Merges a tree of text tokens into a single string"""
+		if isinstance(node, MatchNode):
+			node = node.text
+		return self.terminalNodeToStr(node)
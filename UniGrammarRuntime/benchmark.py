@@ -1,7 +1,11 @@
+import os
 import typing
 from collections import OrderedDict, defaultdict
 from functools import partial
-from math import sqrt
+from math import fsum, log, sqrt
+from random import Random
+
+from .ParserOptions import ParserOptions, parseBackendSpec, sweepBackendSpecs
 
 
 class _BenchmarkMode:
@@ -25,6 +29,16 @@ CriteriaFuncT = typing.Callable[["InMemoryGrammarResources", str], CriteriaFuncR
 CriteriaT = typing.Union[str, CriteriaFuncT]
 
 
+def memoryCriteria(kind: str) -> typing.Callable[[CriteriaFuncT], CriteriaFuncT]:
+	"""Marks a benchmark mode as measuring memory (in bytes) instead of time: `peak` one allocated during the statement, or `retained` by its result"""
+
+	def decorator(func: CriteriaFuncT) -> CriteriaFuncT:
+		func.memory = kind
+		return func
+
+	return decorator
+
+
 class BenchmarkMode(_BenchmarkMode, metaclass=BenchmarkModeMeta):
 	"""All the methods are static, but we cannot use @classmethod and @staticmethod because they cause problems with __name__
 	also pylint considers first arg as `self`, so we disable `no-member`
@@ -45,13 +59,50 @@ class BenchmarkMode(_BenchmarkMode, metaclass=BenchmarkModeMeta):
 		return w.__MAIN_PRODUCTION__, lambda s: w.backend.preprocessAST(w.backend.parse(s))
 
 
+class MemoryBenchmarkMode(_BenchmarkMode, metaclass=BenchmarkModeMeta):
+	"""The modes measuring memory. They trace allocations with `tracemalloc`, which slows everything down and conflicts with other users of it, so they are kept apart from `BenchmarkMode` and are run only when requested explicitly."""
+
+	# pylint:disable=no-self-argument,no-member
+
+	@memoryCriteria("peak")
+	def parseRawMemory(grammarData: "InMemoryGrammarResources", backendName: str) -> CriteriaFuncRetT:
+		return BenchmarkMode.parseRaw(grammarData, backendName)
+
+	@memoryCriteria("peak")
+	def preprocessMemory(grammarData: "InMemoryGrammarResources", backendName: str) -> CriteriaFuncRetT:
+		return BenchmarkMode.preprocess(grammarData, backendName)
+
+	@memoryCriteria("peak")
+	def wrapperMemory(grammarData: "InMemoryGrammarResources", backendName: str) -> CriteriaFuncRetT:
+		return BenchmarkMode.wrapper(grammarData, backendName)
+
+	@memoryCriteria("retained")
+	def retainedMemory(grammarData: "InMemoryGrammarResources", backendName: str) -> CriteriaFuncRetT:
+		w = grammarData.getWrapper(backendName)
+		return w, lambda s: s
+
+
+END_TO_END_CRITERIA = ("parseRaw", "preprocess", "wrapper")  # each of them measures only its own stage, so the time of the whole pipeline is their sum
+
+
+def getBenchmarkMode(name: str) -> typing.Optional[CriteriaFuncT]:
+	"""Returns the standard benchmark mode (either from `BenchmarkMode` or from `MemoryBenchmarkMode`) by its name"""
+	res = getattr(BenchmarkMode, name, None)
+	if res is None:
+		res = getattr(MemoryBenchmarkMode, name, None)
+	return res
+
+
 def normalizeCriteria(criteria: typing.Iterable[CriteriaT]) -> typing.Tuple[typing.Iterable[str], typing.Iterable[CriteriaFuncT]]:
 	criteriaStr = []
 	criteriaFunc = []
 	for c in criteria:
 		if isinstance(c, str):
+			f = getBenchmarkMode(c)
+			if f is None:
+				raise ValueError("Unknown benchmark mode", c)
 			criteriaStr.append(c)
-			criteriaFunc.append(getattr(BenchmarkMode, c))
+			criteriaFunc.append(f)
 		else:
 			criteriaStr.append(c.__name__)
 			criteriaFunc.append(c)
@@ -115,16 +166,63 @@ class LastLayer(RecordsLayer):
 		return self.denormMatrix[idx]
 
 
+def percentile(sortedSamples: typing.Sequence[float], q: float) -> float:
+	"""`q`-th quantile (`0 <= q <= 1`) of sorted samples, linearly interpolated between the closest ranks"""
+	pos = (len(sortedSamples) - 1) * q
+	lo = int(pos)
+	hi = min(lo + 1, len(sortedSamples) - 1)
+	return sortedSamples[lo] + (sortedSamples[hi] - sortedSamples[lo]) * (pos - lo)
+
+
+def meanAndVariance(samples: typing.Iterable[float]) -> typing.Tuple[float, float]:
+	"""Welford's algorithm: unlike `E[x²] - E[x]²` it doesn't suffer from catastrophic cancellation, so the variance is never negative"""
+	n = 0
+	mean = 0.0
+	m2 = 0.0
+	for x in samples:
+		n += 1
+		delta = x - mean
+		mean += delta / n
+		m2 += delta * (x - mean)
+	return mean, (m2 / n if n else 0.0)
+
+
+def bootstrapMeanCI(samples: typing.Sequence[float], resamples: int, confidence: float, rng: Random) -> typing.Tuple[float, float]:
+	"""Percentile bootstrap confidence interval of the mean"""
+	n = len(samples)
+	means = sorted(fsum(rng.choices(samples, k=n)) / n for i in range(resamples))
+	tail = (1 - confidence) / 2
+	return percentile(means, tail), percentile(means, 1 - tail)
+
+
 class BenchmarkStatistics:
-	__slots__ = ("min", "max", "mean", "std", "iters", "repeats")
+	"""Statistics of the time of a single iteration.
+	`min`, `max`, the percentiles and `mad` (median absolute deviation) are of all the samples, since the tail is what they are needed for. `mean`, `std` and the bootstrap confidence interval of the mean (`meanLow`, `meanHigh`) are of the samples without `outliers`, which are the samples farther from the median than `OUTLIERS_THRESHOLD` MADs (scaled to be comparable to std), they are usually caused by interference of other processes.
+	`samples` is a compact sketch of the distribution: `SKETCH_SIZE` evenly spaced quantiles of the samples. The statistics stored by previous versions are 6-tuples, the fields missing in them are `None`."""
+
+	__slots__ = ("min", "max", "mean", "std", "iters", "repeats", "p50", "p90", "p99", "mad", "meanLow", "meanHigh", "outliers", "samples")
+
+	OUTLIERS_THRESHOLD = 3.5
+	MAD_TO_STD = 1.4826  # for normal distribution
+	BOOTSTRAP_RESAMPLES = 200
+	CONFIDENCE = 0.95
+	SKETCH_SIZE = 101
 
-	def __init__(self, min: float, max: float, mean: float, std: float, iters: int, repeats: int):  # pylint:disable=redefined-builtin
+	def __init__(self, min: float, max: float, mean: float, std: float, iters: int, repeats: int, p50: typing.Optional[float] = None, p90: typing.Optional[float] = None, p99: typing.Optional[float] = None, mad: typing.Optional[float] = None, meanLow: typing.Optional[float] = None, meanHigh: typing.Optional[float] = None, outliers: typing.Optional[int] = None, samples: typing.Optional[typing.List[float]] = None):  # pylint:disable=redefined-builtin,too-many-arguments
 		self.min = min
 		self.max = max
 		self.mean = mean
 		self.std = std
 		self.iters = iters
 		self.repeats = repeats
+		self.p50 = p50
+		self.p90 = p90
+		self.p99 = p99
+		self.mad = mad
+		self.meanLow = meanLow
+		self.meanHigh = meanHigh
+		self.outliers = outliers
+		self.samples = samples
 
 	def __iter__(self):
 		for k in __class__.__slots__:  # pylint:disable=undefined-variable
@@ -138,14 +236,23 @@ class BenchmarkStatistics:
 
 	@classmethod
 	def fromSamples(cls, samples: typing.Iterable[float], iters: int) -> "BenchmarkStatistics":
-		repeats = len(samples)
-		mi = min(samples) / iters
-		ma = max(samples) / iters
-		me = sum(samples) / repeats
-		vari = sum(bt * bt for bt in samples) / repeats - me * me
-		std = sqrt(vari) / iters
-		me /= iters
-		return cls(mi, ma, me, std, iters, repeats)
+		"""`samples` are the times of batches of `iters` iterations"""
+		xs = sorted(s / iters for s in samples)
+		repeats = len(xs)
+
+		median = percentile(xs, 0.5)
+		mad = percentile(sorted(abs(x - median) for x in xs), 0.5)
+		if mad > 0:
+			limit = cls.OUTLIERS_THRESHOLD * cls.MAD_TO_STD * mad
+			clean = [x for x in xs if abs(x - median) <= limit]
+		else:
+			clean = xs
+
+		mean, variance = meanAndVariance(clean)
+		meanLow, meanHigh = bootstrapMeanCI(clean, cls.BOOTSTRAP_RESAMPLES, cls.CONFIDENCE, Random(0))  # seeded in order the results to be reproducible
+		sketch = [percentile(xs, i / (cls.SKETCH_SIZE - 1)) for i in range(cls.SKETCH_SIZE)] if repeats > cls.SKETCH_SIZE else xs
+
+		return cls(xs[0], xs[-1], mean, sqrt(variance), iters, repeats, median, percentile(xs, 0.9), percentile(xs, 0.99), mad, meanLow, meanHigh, repeats - len(clean), sketch)
 
 
 class BenchmarksPerCriteria(LastLayer):
@@ -153,7 +260,10 @@ class BenchmarksPerCriteria(LastLayer):
 	NAME = "criteria"
 
 	def _getItem(self, idx):
-		return BenchmarkStatistics(*super()._getItem(idx))
+		res = super()._getItem(idx)
+		if res is None:
+			return None  # not measured yet
+		return BenchmarkStatistics(*res)
 
 
 class BenchmarksPerBackends(RecordsLayer):
@@ -162,12 +272,18 @@ class BenchmarksPerBackends(RecordsLayer):
 	DOWNSTREAM = BenchmarksPerCriteria
 
 
+ScalingT = typing.Dict[str, typing.Dict[str, typing.Any]]
+
+
 class BenchmarkData(_BenchmarkRecords):
-	__slots__ = ("criteria", "backends", "testData", "denormMatrix")
+	"""`versions` are the hashes of grammars and tools the backends have been benchmarked with, the results for a backend with other version are outdated.
+	`scaling` are the results of `benchmarkScaling` per backend: `lengths` of the generated inputs, `values` of the statistic for them and the fitted complexity `exponent`. The inputs themselves are not stored, since they can be huge."""
+
+	__slots__ = ("criteria", "backends", "testData", "denormMatrix", "versions", "scaling")
 	NAME = "testData"
 	DOWNSTREAM = BenchmarksPerBackends
 
-	def __init__(self, criteria, backends: typing.Iterable[str], testData: typing.Iterable[str], denormMatrix: typing.Optional[typing.List[typing.List[typing.List[float]]]] = None) -> None:
+	def __init__(self, criteria, backends: typing.Iterable[str], testData: typing.Iterable[str], denormMatrix: typing.Optional[typing.List[typing.List[typing.List[float]]]] = None, versions: typing.Optional[typing.Mapping[str, str]] = None, scaling: typing.Optional[ScalingT] = None) -> None:
 		self.criteria = OrderedDict((k, i) for i, k in enumerate(criteria))
 		self.backends = OrderedDict((k, i) for i, k in enumerate(backends))
 		self.testData = OrderedDict((k, i) for i, k in enumerate(testData))
@@ -180,6 +296,8 @@ class BenchmarkData(_BenchmarkRecords):
 				for k in range(len(self.testData))
 			]
 		self.denormMatrix = denormMatrix
+		self.versions = dict(versions) if versions else {}
+		self.scaling = dict(scaling) if scaling else {}
 		super().__init__(self)
 
 	def toNormalizedDict(self) -> typing.Mapping[str, typing.Any]:
@@ -187,29 +305,126 @@ class BenchmarkData(_BenchmarkRecords):
 			"criteria": tuple(self.criteria.keys()),
 			"backends": tuple(self.backends.keys()),
 			"testData": tuple(self.testData.keys()),
-			"matrix": self.denormMatrix
+			"matrix": self.denormMatrix,
+			"versions": self.versions,
+			"scaling": self.scaling,
 		}
 
-	def aggregateMetrics(self, criteria: typing.Optional[str] = None, stat: str = "min"):
-		res = defaultdict(float)
-
-		for dPMetrics in self.values():
-			for backendName, backendMetricsPerCriteria in dPMetrics.items():
-				if criteria is not None:
-					res[backendName] += getattr(backendMetricsPerCriteria[criteria], stat)
-				else:
-					res[backendName] += sum(getattr(stats, stat) for stats in backendMetricsPerCriteria.values())
-			return tuple(res.items())
+	def merged(self, criteria: typing.Iterable[str], backends: typing.Iterable[str], testData: typing.Iterable[str]) -> "BenchmarkData":
+		"""Returns a new `BenchmarkData` with the union of the axes of this one and the given ones. The cells of this one are kept, the new ones are empty. The old axes come first, so the indexes of the old cells are unchanged."""
+		res = self.__class__(
+			tuple(self.criteria) + tuple(k for k in criteria if k not in self.criteria),
+			tuple(self.backends) + tuple(k for k in backends if k not in self.backends),
+			tuple(self.testData) + tuple(k for k in testData if k not in self.testData),
+			versions=self.versions,
+			scaling=self.scaling,
+		)
+		for dataRes, dataOld in zip(res.denormMatrix, self.denormMatrix):
+			for backendRes, backendOld in zip(dataRes, dataOld):
+				backendRes[:len(backendOld)] = backendOld
+		return res
 
-	def getFastest(self, criteria: typing.Optional[str] = None):
-		return min(self.aggregateMetrics(criteria, stat="min"), key=lambda it: it[1])  # 1 is for value
+	def invalidate(self, backendName: str) -> None:
+		"""Drops the results for a backend, so they are measured again on the next benchmark"""
+		self.scaling.pop(backendName, None)
+		backendIndex = self.backends.get(backendName, None)
+		if backendIndex is None:
+			return
+		for dataRow in self.denormMatrix:
+			backendRow = dataRow[backendIndex]
+			backendRow[:] = [None] * len(backendRow)
+
+	def updateVersions(self, versions: typing.Mapping[str, str]) -> None:
+		"""Drops the results for the backends, which versions have changed, and remembers the new versions"""
+		for backendName, version in versions.items():
+			if self.versions.get(backendName, None) != version:
+				self.invalidate(backendName)
+				self.versions[backendName] = version
+
+	def _resolveCriteria(self, criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]]) -> typing.Tuple[str, ...]:
+		if criteria is None:
+			return tuple(c for c in END_TO_END_CRITERIA if c in self.criteria)
+		if isinstance(criteria, str):
+			return (criteria,)
+		return tuple(criteria)
+
+	def aggregateMetrics(self, criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None, stat: str = "min", weights: typing.Optional[typing.Mapping[str, float]] = None, perKB: bool = False) -> typing.Tuple[typing.Tuple[str, float], ...]:
+		"""Returns pairs `(backendName, value)`, the value is the weighted mean over test data of the sum of `stat` over `criteria`.
+		`criteria` is a name of a criteria or a collection of them. `None` means the sum of `END_TO_END_CRITERIA`, which is the time of the whole pipeline from a string to wrapper objects.
+		`weights` map test data to their weights, i.e. their shares in the real workload. With `weights` the test data missing in them are not taken into account.
+		With `perKB` the times are divided by the size of test data in KiB, so the large inputs don't dominate.
+		The backends which have no results for some of the test data and criteria are not ranked, since a partial sum is not comparable to a full one."""
+		criteriaIdxs = [self.criteria[c] for c in self._resolveCriteria(criteria)]
 
-	def getSorted(self, criteria: typing.Optional[str] = None, reverse: bool = False):
-		return sorted(self.aggregateMetrics(criteria, stat="min"), reverse=reverse, key=lambda it: it[1])  # 1 is for value
+		res = defaultdict(float)
+		incomplete = set()
+		totalWeight = 0.
+
+		for dataPiece, dataIdx in self.testData.items():
+			weight = 1. if weights is None else weights.get(dataPiece, 0.)
+			if not weight:
+				continue
+
+			if perKB:
+				weight /= max(len(dataPiece.encode("utf-8")), 1) / 1024
+			totalWeight += 1. if weights is None else weights[dataPiece]
+
+			dataRow = self.denormMatrix[dataIdx]
+			for backendName, backendIdx in self.backends.items():
+				backendRow = dataRow[backendIdx]
+				for criteriaIdx in criteriaIdxs:
+					stats = backendRow[criteriaIdx]
+					value = getattr(BenchmarkStatistics(*stats), stat) if stats is not None else None  # the results of previous versions have no robust statistics
+					if value is None:
+						incomplete.add(backendName)
+					else:
+						res[backendName] += weight * value
+
+		return tuple((backendName, value / totalWeight) for backendName, value in res.items() if backendName not in incomplete)
+
+	def getFastest(self, criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None, stat: str = "min", weights: typing.Optional[typing.Mapping[str, float]] = None, perKB: bool = False):
+		"""`stat` is the name of any field of `BenchmarkStatistics`, i.e. `p99` to rank by tail latency. See `aggregateMetrics` for the rest of the args."""
+		ranking = self.aggregateMetrics(criteria, stat, weights, perKB)
+		if not ranking:
+			# i.e. the metrics contain only the results of `benchmarkScaling`
+			raise ValueError("There are no complete benchmark results to choose the fastest backend from, benchmark the grammar first")
+		return min(ranking, key=lambda it: it[1])  # 1 is for value
+
+	def getSorted(self, criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None, reverse: bool = False, stat: str = "min", weights: typing.Optional[typing.Mapping[str, float]] = None, perKB: bool = False):
+		return sorted(self.aggregateMetrics(criteria, stat, weights, perKB), reverse=reverse, key=lambda it: it[1])  # 1 is for value
+
+	def getCrossovers(self, criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None, stat: str = "min") -> typing.Tuple[typing.Tuple[int, ...], typing.Tuple[str, ...]]:
+		"""Returns `(bounds, backendNames)`: the inputs shorter than `bounds[i]` (and not shorter than `bounds[i - 1]`) are parsed the fastest by `backendNames[i]`, the ones not shorter than `bounds[-1]` - by `backendNames[-1]`.
+		The fastest backend is determined for the test data of each length, a bound between two lengths with different fastest backends is their geometric mean, since the costs usually scale polynomially."""
+		dataPerLength = defaultdict(dict)
+		for dataPiece in self.testData:
+			dataPerLength[len(dataPiece)][dataPiece] = 1.
+
+		bounds = []
+		backendNames = []
+		prevLength = None
+		for length in sorted(dataPerLength):
+			ranking = self.aggregateMetrics(criteria, stat, dataPerLength[length])
+			if not ranking:
+				continue
+			fastest = min(ranking, key=lambda it: it[1])[0]  # 1 is for value, 0 is for name
+			if not backendNames or backendNames[-1] != fastest:
+				if backendNames:
+					bounds.append(round(sqrt(max(prevLength, 1) * length)))
+				backendNames.append(fastest)
+			prevLength = length
+
+		if not backendNames:
+			raise ValueError("There are no complete benchmark results to learn the crossovers from")
+
+		return tuple(bounds), tuple(backendNames)
 
 	@classmethod
 	def fromNormalizedDict(cls, d: typing.Mapping[str, typing.Any]) -> "BenchmarkData":
-		return cls(criteria=d["criteria"], backends=d["backends"], testData=d["testData"], denormMatrix=d["matrix"])
+		return cls(criteria=d["criteria"], backends=d["backends"], testData=d["testData"], denormMatrix=d["matrix"], versions=d.get("versions", None), scaling=d.get("scaling", None))
+
+
+MIN_BATCH_TIME = 1e-3
 
 
 def _benchmarkSingle(Timer, stmtIncomplete, setup, dataPiece, smallCount, timeBudget) -> BenchmarkStatistics:
@@ -224,28 +439,146 @@ def _benchmarkSingle(Timer, stmtIncomplete, setup, dataPiece, smallCount, timeBu
 	timePerIterPrelim = smallTime / smallCount
 	restItersCount = round((timeBudget - smallTime) / timePerIterPrelim)
 
-	iters = round(sqrt(restItersCount))
-	repeats = restItersCount // iters
+	# batches must be long enough for the timer overhead to be negligible, but as short as possible, in order slow iterations not to be averaged out: the tail matters
+	iters = max(1, round(MIN_BATCH_TIME / timePerIterPrelim))
+	repeats = max(1, restItersCount // iters)
 
 	bigTimes = t.repeat(repeat=repeats, number=iters)
 
 	return BenchmarkStatistics.fromSamples(bigTimes, iters)
 
 
-def _reBenchmark(res, grammarData, smallCount, timeBudget, testData, backendNames, benchmarkModesFuncs):
-	from timeit import Timer  # pylint:disable=import-outside-toplevel
+MEMORY_REPEATS = 5  # allocations are almost deterministic, so a few samples are enough
+
+
+def _benchmarkMemorySingle(stmtIncomplete, setup, dataPiece, retained: bool) -> BenchmarkStatistics:
+	"""Measures the memory allocated by the statement with `tracemalloc`: the peak during the statement or the size retained by its result. Only the allocations made after tracing is started are accounted, so the memory of the argument is not. Tracing must not be enabled by anyone else: starting and stopping it here would reset their traces."""
+	import gc  # pylint:disable=import-outside-toplevel
+	import tracemalloc  # pylint:disable=import-outside-toplevel
+
+	if tracemalloc.is_tracing():
+		raise RuntimeError("`tracemalloc` is already tracing, memory cannot be measured without breaking its current user")
 
-	for backendIndex, backendName in enumerate(backendNames):
+	stmtArg = setup(dataPiece)
+	stmt = partial(stmtIncomplete, stmtArg)
+
+	stmt()  # to test that works and to warm-up: lazily initialized caches must not be accounted
+
+	samples = []
+	for i in range(MEMORY_REPEATS):
+		gc.collect()
+		tracemalloc.start()
+		try:
+			res = stmt()
+			if retained:
+				gc.collect()  # the garbage of the statement itself is not retained
+				samples.append(tracemalloc.get_traced_memory()[0])  # 0 is for current
+			else:
+				samples.append(tracemalloc.get_traced_memory()[1])  # 1 is for peak
+			del res
+		finally:
+			tracemalloc.stop()
+
+	return BenchmarkStatistics.fromSamples(samples, 1)
+
+
+def _measure(Timer, benchmarkMode: CriteriaFuncT, stmtIncomplete, setup, dataPiece, smallCount, timeBudget) -> BenchmarkStatistics:
+	memory = getattr(benchmarkMode, "memory", None)
+	if memory is None:
+		return _benchmarkSingle(Timer, stmtIncomplete, setup, dataPiece, smallCount, timeBudget)
+	return _benchmarkMemorySingle(stmtIncomplete, setup, dataPiece, memory == "retained")
+
+
+def _iterMissingCells(res: BenchmarkData, backendNames: typing.Collection[str], benchmarkModesFuncs: typing.Sequence[typing.Optional[CriteriaFuncT]]) -> typing.Iterator[typing.Tuple[str, int, CriteriaFuncT, int, typing.Iterator[typing.Tuple[int, str]]]]:
+	"""Yields the cells not measured yet, grouped by backends and modes. Only the backends from `backendNames` and the modes having a func (`benchmarkModesFuncs` is aligned with `res.criteria`) can be measured."""
+	for backendName, backendIndex in res.backends.items():
+		if backendName not in backendNames:
+			continue
 		for modeIndex, benchmarkMode in enumerate(benchmarkModesFuncs):
-			stmtIncomplete, setup = benchmarkMode(grammarData, backendName)
+			if benchmarkMode is None:
+				continue
+			missingData = [(dataIndex, dataPiece) for dataPiece, dataIndex in res.testData.items() if res.denormMatrix[dataIndex][backendIndex][modeIndex] is None]
+			if missingData:
+				yield backendName, backendIndex, benchmarkMode, modeIndex, missingData
 
-			for dataIndex, dataPiece in enumerate(testData):
-				res.denormMatrix[dataIndex][backendIndex][modeIndex] = _benchmarkSingle(Timer, stmtIncomplete, setup, dataPiece, smallCount, timeBudget).toTuple()
 
+def _reBenchmark(res, grammarData, smallCount, timeBudget, backendNames, benchmarkModesFuncs):
+	from timeit import Timer  # pylint:disable=import-outside-toplevel
+
+	for backendName, backendIndex, benchmarkMode, modeIndex, missingData in _iterMissingCells(res, backendNames, benchmarkModesFuncs):
+		stmtIncomplete, setup = benchmarkMode(grammarData, backendName)
 
-def benchmark(grammarData: "InMemoryGrammarResources", testData: typing.Iterable[str], backendNames: typing.Iterable[str], timeBudget: float, benchmarkModes: typing.Iterable[CriteriaT], smallCount, prevRes=None):
+		for dataIndex, dataPiece in missingData:
+			res.denormMatrix[dataIndex][backendIndex][modeIndex] = _measure(Timer, benchmarkMode, stmtIncomplete, setup, dataPiece, smallCount, timeBudget).toTuple()
+
+
+_workerGrammarData = None
+
+
+def _initBenchmarkWorker(bundleDir: "Path", grammarName: str, useCompiledCache: bool, cpusQueue: typing.Optional["multiprocessing.Queue"]) -> None:
+	"""Pins the worker process to its own CPU and loads the grammar from the bundle once per worker"""
+	global _workerGrammarData  # pylint:disable=global-statement
+	from .ParserBundle import ParserBundle  # pylint:disable=import-outside-toplevel
+
+	if cpusQueue is not None:
+		os.sched_setaffinity(0, (cpusQueue.get(),))
+
+	_workerGrammarData = ParserBundle(bundleDir, useCompiledCache).grammars[grammarName]
+
+
+def _benchmarkCell(backendName: str, benchmarkMode: CriteriaFuncT, dataPiece: str, smallCount: int, timeBudget: float) -> typing.Tuple[float, ...]:
+	from timeit import Timer  # pylint:disable=import-outside-toplevel
+
+	stmtIncomplete, setup = benchmarkMode(_workerGrammarData, backendName)  # backends are cached, so the grammar is compiled once per worker
+	return _measure(Timer, benchmarkMode, stmtIncomplete, setup, dataPiece, smallCount, timeBudget).toTuple()
+
+
+def _reBenchmarkParallel(res, grammarData, smallCount, timeBudget, backendNames, benchmarkModesFuncs, workers: typing.Optional[int] = None):
+	"""The cells of the matrix are independent, so they are measured in a pool of processes, each pinned to an own CPU (where the OS allows it) in order not to be disturbed by the others and not to be migrated between CPUs.
+	Benchmark modes must be picklable, which is true for the ones in `BenchmarkMode` and `MemoryBenchmarkMode` and for any module-level functions."""
+	import multiprocessing  # pylint:disable=import-outside-toplevel
+	from concurrent.futures import ProcessPoolExecutor, as_completed  # pylint:disable=import-outside-toplevel
+
+	if hasattr(os, "sched_getaffinity"):
+		cpus = sorted(os.sched_getaffinity(0))
+		if workers is None or workers > len(cpus):
+			workers = len(cpus)
+	else:
+		cpus = None
+		if workers is None:
+			workers = os.cpu_count() or 1
+
+	ctx = multiprocessing.get_context()
+	if cpus is not None:
+		cpusQueue = ctx.Queue()
+		for cpu in cpus[:workers]:
+			cpusQueue.put(cpu)
+	else:
+		cpusQueue = None
+
+	bundle = grammarData.parent
+	with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_initBenchmarkWorker, initargs=(bundle.bundleDir, grammarData.name, bundle.compiledCache is not None, cpusQueue)) as pool:
+		cells = {}
+		for backendName, backendIndex, benchmarkMode, modeIndex, missingData in _iterMissingCells(res, backendNames, benchmarkModesFuncs):
+			for dataIndex, dataPiece in missingData:
+				cells[pool.submit(_benchmarkCell, backendName, benchmarkMode, dataPiece, smallCount, timeBudget)] = (dataIndex, backendIndex, modeIndex)
+
+		for f in as_completed(cells):
+			dataIndex, backendIndex, modeIndex = cells[f]
+			res.denormMatrix[dataIndex][backendIndex][modeIndex] = f.result()
+
+
+def benchmark(grammarData: "InMemoryGrammarResources", testData: typing.Iterable[str], backendNames: typing.Iterable[str], timeBudget: float, benchmarkModes: typing.Iterable[CriteriaT], smallCount, prevRes: typing.Optional[BenchmarkData] = None, parserOptions: typing.Optional[typing.Iterable[typing.Optional[ParserOptions]]] = None, parallel: bool = False, workers: typing.Optional[int] = None):
+	"""By default all the modes of `BenchmarkMode` are measured. The ones of `MemoryBenchmarkMode` (and any marked with `memoryCriteria`) have to be requested explicitly, they measure bytes instead of seconds and ignore `timeBudget`.
+	`parallel` makes the cells to be measured in `workers` processes, by default one per available CPU. `timeBudget` is still per cell.
+	With `prevRes` only the missing cells of the backends from `backendNames` are measured: the ones of new backends, test data and modes (also the ones of the test data and modes of `prevRes` in combination with the new ones), and the ones of the backends which grammars or tools have changed since `prevRes`. The results of the other backends of `prevRes` are kept as they are, except the outdated ones, which are dropped. `prevRes` itself is not modified."""
 	if isinstance(testData, str):
 		testData = (testData,)
+	if parserOptions is not None:
+		# each combination of a backend and options is benchmarked as a separate backend, named by its spec
+		backendNames = tuple(sweepBackendSpecs(backendNames, parserOptions, lambda backendName: grammarData.parent.backends[backendName].PARSER_OPTIONS))
+	else:
+		backendNames = tuple(backendNames)
 	if benchmarkModes is None:
 		benchmarkModes = BenchmarkMode.__all__
 	elif callable(benchmarkModes) or isinstance(benchmarkModes, str):
@@ -256,8 +589,74 @@ def benchmark(grammarData: "InMemoryGrammarResources", testData: typing.Iterable
 	if prevRes is None:
 		res = BenchmarkData(benchmarkModesStrs, backendNames, testData)
 	else:
-		raise NotImplementedError("Currently editing is not implemented")
+		res = prevRes.merged(benchmarkModesStrs, backendNames, testData)
+
+	# the backends of `prevRes` which are no longer in the bundle cannot be measured
+	measurableBackends = {backendName for backendName in res.backends if parseBackendSpec(backendName)[0] in grammarData.parent.backends}
+	res.updateVersions({backendName: grammarData.getBackendVersion(backendName) for backendName in measurableBackends})
+	measurableBackends.intersection_update(backendNames)
 
-	_reBenchmark(res, grammarData, smallCount, timeBudget, testData, backendNames, benchmarkModesFuncs)
+	# the modes of `prevRes` can be measured only if they are the standard ones or are passed again
+	funcsByName = dict(zip(benchmarkModesStrs, benchmarkModesFuncs))
+	benchmarkModesFuncs = tuple(funcsByName.get(modeName, getBenchmarkMode(modeName)) for modeName in res.criteria)
+
+	if parallel:
+		_reBenchmarkParallel(res, grammarData, smallCount, timeBudget, measurableBackends, benchmarkModesFuncs, workers)
+	else:
+		_reBenchmark(res, grammarData, smallCount, timeBudget, measurableBackends, benchmarkModesFuncs)
 
 	return res
+
+
+SCALES = (1, 10, 100, 1000)
+
+
+def makeScaledInputs(seed: typing.Union[str, typing.Callable[[int], str]], scales: typing.Iterable[int] = SCALES, separator: str = "") -> typing.Tuple[str, ...]:
+	"""Generates an input for each of `scales`. `seed` is either a function generating an input of the given scale, or a string being an item of a list production, which is repeated `scale` times, joined by `separator`."""
+	if callable(seed):
+		return tuple(seed(scale) for scale in scales)
+	return tuple(separator.join((seed,) * scale) for scale in scales)
+
+
+def fitExponent(lengths: typing.Sequence[float], values: typing.Sequence[float]) -> float:
+	"""Least-squares slope of the line fitted to the points in log-log scale: the `k` in `value ~ length ** k`. `1` is linear, `2` is quadratic."""
+	xs = [log(x) for x in lengths]
+	ys = [log(y) for y in values]
+	xMean = fsum(xs) / len(xs)
+	yMean = fsum(ys) / len(ys)
+	return fsum((x - xMean) * (y - yMean) for x, y in zip(xs, ys)) / fsum((x - xMean) ** 2 for x in xs)
+
+
+def benchmarkScaling(grammarData: "InMemoryGrammarResources", seed: typing.Union[str, typing.Callable[[int], str]], backendNames: typing.Iterable[str], timeBudget: float, scales: typing.Iterable[int] = SCALES, separator: str = "", criteria: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None, stat: str = "min", smallCount: int = 100, parallel: bool = False, workers: typing.Optional[int] = None) -> ScalingT:
+	"""Benchmarks backends on the inputs generated by `makeScaledInputs` and fits an empirical complexity exponent for each backend. Super-linear exponents reveal memoization misses and ambiguity blowups.
+	`criteria` must be of the same kind (either time or memory ones), by default they are `END_TO_END_CRITERIA`. `smallCount` is for the smallest input, it is divided by the scale for the larger ones, in order the preliminary measurement not to exceed `timeBudget` on them."""
+	scales = tuple(scales)  # may be an iterator
+	inputs = makeScaledInputs(seed, scales, separator)
+	if criteria is None:
+		criteria = END_TO_END_CRITERIA
+	elif isinstance(criteria, str):
+		criteria = (criteria,)
+	criteria = tuple(criteria)
+
+	res = None
+	for scale, dataPiece in zip(scales, inputs):
+		res = benchmark(grammarData, (dataPiece,), backendNames, timeBudget, criteria, max(1, smallCount // scale), prevRes=res, parallel=parallel, workers=workers)
+
+	scaling = {}
+	for backendName in res.backends:
+		lengths = []
+		values = []
+		for dataPiece in inputs:
+			ranking = dict(res.aggregateMetrics(criteria, stat, {dataPiece: 1.}))
+			value = ranking.get(backendName, None)
+			if value is not None and value > 0:
+				lengths.append(len(dataPiece))
+				values.append(value)
+
+		scaling[backendName] = {
+			"lengths": lengths,
+			"values": values,
+			"exponent": fitExponent(lengths, values) if len(set(lengths)) > 1 else None,
+		}
+
+	return scaling
@@ -1,5 +1,10 @@
+import sys
 import typing
+from codecs import getincrementaldecoder
 from collections import OrderedDict
+from itertools import islice
+from mmap import mmap
+from types import CodeType, ModuleType
 from weakref import ref
 
 try:
@@ -7,6 +12,12 @@ try:
 except ImportError:
 	inf = float("inf")
 
+try:
+	from importlib.metadata import PackageNotFoundError
+	from importlib.metadata import version as _getDistributionVersion
+except ImportError:
+	_getDistributionVersion = None
+
 
 class AttrDict(dict):
 	__slots__ = ()
@@ -29,6 +40,92 @@ def flattenDictsIntoIterable(el) -> typing.Iterable:
 		yield el
 
 
+def chunked(items: typing.Iterable[typing.Any], chunkSize: int) -> typing.Iterator[typing.List[typing.Any]]:
+	"""Splits an iterable into lists of `chunkSize` items (the last one may be shorter)"""
+	it = iter(items)
+	while True:
+		chunk = list(islice(it, chunkSize))
+		if not chunk:
+			return
+		yield chunk
+
+
+BufferT = typing.Union[bytes, bytearray, memoryview, mmap]
+bufferTypes = (bytes, bytearray, memoryview, mmap)
+
+
+def decodeBuffer(buf: BufferT, encoding: str = "utf-8") -> str:
+	"""Decodes a `bytes`-like object without making an intermediate `bytes` copy of it"""
+	return str(buf, encoding)
+
+
+def _readChunks(f: typing.IO, chunkSize: int) -> typing.Iterator[typing.Union[str, bytes]]:
+	while True:
+		chunk = f.read(chunkSize)
+		if not chunk:
+			return
+		yield chunk
+
+
+def _iterWindows(buf: BufferT, chunkSize: int) -> typing.Iterator[memoryview]:
+	buf = memoryview(buf)
+	for i in range(0, len(buf), chunkSize):
+		yield buf[i : i + chunkSize]
+
+
+def iterDecoded(chunks: typing.Iterable[typing.Union[str, BufferT]], encoding: str = "utf-8") -> typing.Iterator[str]:
+	"""Incrementally decodes `bytes`-like chunks, correctly handling chars split between them. `str` chunks are passed as they are."""
+	decoder = None
+	for chunk in chunks:
+		if isinstance(chunk, str):
+			yield chunk
+			continue
+
+		if decoder is None:
+			decoder = getincrementaldecoder(encoding)()
+		chunk = decoder.decode(chunk)
+		if chunk:
+			yield chunk
+
+	if decoder is not None:
+		chunk = decoder.decode(b"", True)
+		if chunk:
+			yield chunk
+
+
+def iterRecords(source: typing.Union[typing.IO, BufferT, typing.Iterable[typing.Union[str, BufferT]]], boundary: str = "\n", chunkSize: int = 1 << 16, encoding: str = "utf-8") -> typing.Iterator[str]:
+	"""Lazily splits a stream into records separated by `boundary`. `source` is either a file-like object (text or binary) read in `chunkSize` pieces, or a `bytes`-like object (i.e. `mmap`) decoded in `chunkSize` windows, or an iterable of chunks. Memory usage is bounded by record size, not by stream size."""
+	if hasattr(source, "read") and not isinstance(source, mmap):
+		source = _readChunks(source, chunkSize)
+	elif isinstance(source, bufferTypes):
+		source = _iterWindows(source, chunkSize)
+	source = iterDecoded(source, encoding)
+
+	overlapLen = len(boundary) - 1
+	pending = []
+	for chunk in source:
+		if overlapLen and pending:
+			# a boundary may be split between chunks, so the end of the previous chunk is rechecked
+			last = pending[-1]
+			overlap = last[-overlapLen:]
+			pending[-1] = last[:len(last) - len(overlap)]
+			chunk = overlap + chunk
+
+		parts = chunk.split(boundary)
+		if len(parts) == 1:
+			pending.append(chunk)
+			continue
+
+		pending.append(parts[0])
+		yield "".join(pending)
+		yield from islice(parts, 1, len(parts) - 1)
+		pending = [parts[-1]]
+
+	tail = "".join(pending)
+	if tail:
+		yield tail
+
+
 class ListLikeDict(OrderedDict):
 	"""A very fucking redundant and limited hack."""
 
@@ -47,6 +144,117 @@ class ListLikeDict(OrderedDict):
 		return iter(self.values())
 
 
+class LRUCache(OrderedDict):
+	"""A dict evicting the least recently used items when it grows larger than `maxSize`. `None` means unbounded."""
+
+	__slots__ = ("maxSize",)
+
+	def __init__(self, maxSize: typing.Optional[int] = None) -> None:
+		super().__init__()
+		self.maxSize = maxSize
+
+	def __getitem__(self, k: typing.Any) -> typing.Any:
+		res = super().__getitem__(k)
+		self.move_to_end(k)
+		return res
+
+	def __setitem__(self, k: typing.Any, v: typing.Any) -> None:
+		super().__setitem__(k, v)
+		self.move_to_end(k)
+		if self.maxSize is not None:
+			while len(self) > self.maxSize:
+				self.popitem(last=False)
+
+
+class ListLikeDictKeys:
+	"""An index of names of children, shared between all the nodes having the same names. Use `intern` to get it."""
+
+	__slots__ = ("names", "index", "sourcePositions")
+
+	INTERNED_MAX_COUNT = 4096  # some tools name children by their positions, so every new count of children is a new set of names; without a bound long-running processes would leak
+	_interned = {}
+
+	def __init__(self, rawNames: typing.Tuple[str, ...]) -> None:
+		index = {}
+		lastPositions = {}
+		for i, k in enumerate(rawNames):
+			index.setdefault(k, len(index))
+			lastPositions[k] = i
+
+		self.names = tuple(index)
+		self.index = index
+
+		# like in a dict, if a name is repeated, its first position and its last value are used
+		if len(index) != len(rawNames):
+			self.sourcePositions = tuple(lastPositions[k] for k in self.names)
+		else:
+			self.sourcePositions = None
+
+	@classmethod
+	def intern(cls, rawNames: typing.Tuple[str, ...]) -> "ListLikeDictKeys":
+		interned = cls._interned
+		res = interned.get(rawNames, None)
+		if res is None:
+			# a plain dict is used since it is on the hot path; its operations are atomic, so no lock is needed: a race only makes an extra instance
+			if len(interned) >= cls.INTERNED_MAX_COUNT:
+				interned.clear()  # cheaper than LRU bookkeeping on each lookup; the dropped indexes may still be used by nodes, it is fine, the new nodes just get other instances
+			interned[rawNames] = res = cls(rawNames)
+		return res
+
+
+class CompactListLikeDict:
+	"""A compact replacement of `ListLikeDict`: the names are stored in a `ListLikeDictKeys` shared between nodes, the values are stored in a flat sequence. Both positional and named access are O(1)."""
+
+	__slots__ = ("_keys", "_values")
+
+	def __init__(self, keys: ListLikeDictKeys, values: typing.Sequence[typing.Any]) -> None:
+		self._keys = keys
+		self._values = values
+
+	@classmethod
+	def fromPairs(cls, names: typing.Tuple[str, ...], values: typing.Sequence[typing.Any]) -> "CompactListLikeDict":
+		"""`values` sequence is not copied if it is a `tuple` or a `list`, so it must not be modified after that"""
+		keys = ListLikeDictKeys.intern(names)
+		sourcePositions = keys.sourcePositions
+		if sourcePositions is not None:
+			values = tuple(values[i] for i in sourcePositions)
+		elif not isinstance(values, (tuple, list)):
+			values = tuple(values)
+		return cls(keys, values)
+
+	def __getitem__(self, k: typing.Union[int, str]) -> typing.Any:
+		if isinstance(k, int):
+			return self._values[k]
+		return self._values[self._keys.index[k]]
+
+	def get(self, k: str, default: typing.Any = None) -> typing.Any:
+		idx = self._keys.index.get(k, None)
+		if idx is None:
+			return default
+		return self._values[idx]
+
+	def __contains__(self, k: str) -> bool:
+		return k in self._keys.index
+
+	def __iter__(self):
+		return iter(self._values)
+
+	def __len__(self) -> int:
+		return len(self._values)
+
+	def keys(self) -> typing.Tuple[str, ...]:
+		return self._keys.names
+
+	def values(self) -> typing.Sequence[typing.Any]:
+		return self._values
+
+	def items(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+		return zip(self._keys.names, self._values)
+
+	def __repr__(self) -> str:
+		return self.__class__.__name__ + "(" + repr(dict(self.items())) + ")"
+
+
 class ListLikeAttrDict(ListLikeDict):
 	__slots__ = ()
 
@@ -54,13 +262,37 @@ class ListLikeAttrDict(ListLikeDict):
 		return self[k]
 
 
-def getPythonModule(fileText: str, fileName: str):
-	compiled = compile(fileText, fileName, "exec", optimize=2)
-	globalz = {}
-	eval(compiled, globalz)
+def getDistributionVersion(name: str) -> typing.Optional[str]:
+	"""Returns the version of an installed distribution or `None` if it cannot be determined"""
+	if _getDistributionVersion is None:
+		return None
+
+	try:
+		return _getDistributionVersion(name)
+	except PackageNotFoundError:
+		return None
+
+
+def compilePythonModule(fileText: typing.Union[str, "ast.Module"], fileName: str) -> CodeType:
+	return compile(fileText, str(fileName), "exec", optimize=2)
+
+
+def execPythonCode(compiled: CodeType, moduleName: typing.Optional[str] = None) -> typing.Dict[str, typing.Any]:
+	"""Executes code of a module and returns its globals. If `moduleName` is given, the module is registered in `sys.modules` under that name, so the classes defined in it can be pickled."""
+	if moduleName is None:
+		globalz = {}
+	else:
+		m = ModuleType(moduleName)
+		sys.modules[moduleName] = m
+		globalz = m.__dict__
+	eval(compiled, globalz)  # pylint:disable=eval-used
 	return globalz
 
 
+def getPythonModule(fileText: typing.Union[str, "ast.Module"], fileName: str, moduleName: typing.Optional[str] = None):
+	return execPythonCode(compilePythonModule(fileText, fileName), moduleName)
+
+
 class NodeWithAttrChildrenMixin:
 	__slots__ = ()
 